@@ -5,13 +5,393 @@ This file is used to deal with most SQL queries and data within the database.
 This script is imported by main_app.py when the main program is run.
 
 The packages that should be installed to be able to run this file are:
-werkzeug.security, sqlite3, time, random
+werkzeug.security, sqlite3, os, time, threading, hmac, secrets, queue, pathlib, contextlib, collections, flask
 """
 
 import sqlite3
+import os
 from werkzeug.security import check_password_hash, generate_password_hash
 import time
-import random
+import threading
+import hmac
+import secrets
+import queue
+import pathlib
+from contextlib import contextmanager, nullcontext
+from collections import OrderedDict, namedtuple
+from flask import g, has_app_context
+
+
+# the settings applied to the write connection when it is first opened.
+# WAL lets the database be read while it is being written to.
+WRITE_PRAGMAS = "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;"
+# the settings applied to every connection - the larger cache (64MiB) keeps more of the database
+# in memory between queries, and up to 256MiB of the file is memory-mapped so reads don't need to copy it.
+PRAGMAS = "PRAGMA temp_store=MEMORY; PRAGMA cache_size=-65536; PRAGMA mmap_size=268435456;"
+
+# the number of compiled statements each connection keeps, so that a query that has been run
+# before (with its values passed as parameters) is not parsed and planned again.
+CACHED_STATEMENTS = 256
+
+# the total number of connections kept open for each database file (one write connection,
+# and the rest are read-only). 8 matches the number of threads Flask serves requests with, and it can be
+# changed with the DB_POOL_SIZE environment variable (at least 2 - the writer and one reader).
+POOL_SIZE = max(2, int(os.environ.get("DB_POOL_SIZE", 8)))
+
+
+class PreparedStatementCache:
+    """
+    PreparedStatementCache class
+
+    Keeps a cursor for each of the most recently used SQL queries on a connection, so that a query that is run
+    again reuses its cursor (and the compiled statement that sqlite3 caches for that SQL text).
+
+    Only queries that are always run to completion (i.e. all rows are fetched) use the cache, so that a
+    cached cursor is never left in the middle of a statement. The cache is emptied whenever the database's
+    structure is changed (CREATE, DROP or ALTER).
+
+    Attributes
+    ----------
+    conn: sqlite3.Connection
+        The connection that the cursors belong to.
+    maxsize: int
+        The largest number of cursors that are kept.
+
+    Methods
+    -------
+    cursor(sql: str)
+        Returns the cursor to execute 'sql' with, making a new one if it isn't cached.
+
+    clear()
+        Removes every cursor from the cache.
+    """
+
+    def __init__(self, conn, maxsize=CACHED_STATEMENTS):
+        self.conn = conn
+        self.maxsize = maxsize
+        self.cursors = OrderedDict()
+
+    def cursor(self, sql):
+        """
+        Returns the cursor to execute 'sql' with, making a new one if it isn't cached.
+
+        parameters
+        ----------
+        sql: str
+            The SQL query that is about to be executed.
+
+        returns
+        --------
+        sqlite3.Cursor
+        """
+        words = sql.split(None, 1)
+        if words and words[0].upper() in ("CREATE", "DROP", "ALTER"):
+            # the structure of the database is changing, so none of the cached statements are kept
+            self.clear()
+            return self.conn.cursor()
+        cursor = self.cursors.get(sql)
+        if cursor is None:
+            cursor = self.conn.cursor()
+            self.cursors[sql] = cursor
+            if len(self.cursors) > self.maxsize:
+                self.cursors.popitem(last=False)
+        else:
+            self.cursors.move_to_end(sql)
+        return cursor
+
+    def clear(self):
+        """
+        Removes every cursor from the cache.
+
+        No required parameters.
+
+        returns
+        --------
+        None
+        """
+        self.cursors.clear()
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    PooledConnection class
+
+    Inherits from sqlite3.Connection.
+
+    A connection kept open by a ConnectionPool, with its own PreparedStatementCache.
+
+    Attributes
+    ----------
+    statements: PreparedStatementCache
+        The cached cursors for the queries run on this connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements = PreparedStatementCache(self)
+
+
+class ConnectionPool:
+    """
+    ConnectionPool class
+
+    Keeps the connections to a database file open so that they (and their caches) can be reused by
+    every query, rather than opening and closing a new connection each time.
+
+    There is a single connection used to write to the database, and up to size - 1 read-only
+    connections so that several threads can read from the database at the same time.
+
+    Attributes
+    ----------
+    db: str
+        The path to the database that the connections are opened to.
+    size: int
+        The total number of connections that can be open at once.
+
+    Methods
+    -------
+    connect(read_only: bool)
+        Opens a new connection to the database.
+
+    get_reader()
+        Takes a read-only connection from the pool, opening a new one if the pool is not full yet.
+
+    acquire(write: bool)
+        Context manager that lends a connection to the caller and returns it to the pool afterwards.
+    """
+
+    def __init__(self, db, size=POOL_SIZE):
+        self.db = db
+        self.size = size
+        # there is only one write connection, so only one thread can use it at a time
+        self.writer = None
+        self.write_lock = threading.RLock()
+        # the read-only connections that are not being used at the moment
+        self.readers = queue.Queue(maxsize=size - 1)
+        self.opened = 0
+        self.open_lock = threading.Lock()
+
+    def connect(self, read_only):
+        """
+        Opens a new connection to the database.
+
+        The connection is in autocommit mode, so each query is committed as soon as it is executed.
+
+        parameters
+        ----------
+        read_only: bool
+            Whether the connection should only be allowed to read from the database.
+
+        returns
+        --------
+        sqlite3.Connection
+        """
+        if read_only:
+            uri = pathlib.Path(self.db).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None,
+                                   cached_statements=CACHED_STATEMENTS, factory=PooledConnection)
+        else:
+            conn = sqlite3.connect(self.db, check_same_thread=False, isolation_level=None,
+                                   cached_statements=CACHED_STATEMENTS, factory=PooledConnection)
+            conn.executescript(WRITE_PRAGMAS)
+        conn.executescript(PRAGMAS)
+        return conn
+
+    def get_reader(self):
+        """
+        Takes a read-only connection from the pool, opening a new one if the pool is not full yet.
+
+        If every connection is in use, this waits until another thread returns one.
+
+        No required parameters.
+
+        returns
+        --------
+        sqlite3.Connection
+        """
+        try:
+            return self.readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self.open_lock:
+            if self.opened < self.size - 1:
+                # the write connection creates the database file (and sets WAL mode) before any
+                # read-only connection can be opened to it.
+                with self.acquire(True):
+                    pass
+                conn = self.connect(True)
+                self.opened += 1
+                return conn
+        return self.readers.get()
+
+    @contextmanager
+    def acquire(self, write=False):
+        """
+        Context manager that lends a connection to the caller and returns it to the pool afterwards.
+
+        parameters
+        ----------
+        write: bool
+            True if the query will change the database, so the write connection is needed.
+
+        returns
+        --------
+        sqlite3.Connection
+        """
+        if write:
+            with self.write_lock:
+                if self.writer is None:
+                    self.writer = self.connect(False)
+                yield self.writer
+        else:
+            conn = self.get_reader()
+            try:
+                yield conn
+            finally:
+                self.readers.put(conn)
+
+
+# the columns of the EmailSettingTable that hold a user's email permissions
+EMAIL_FIELDS = ("EmailReminders", "EmailInfo", "EmailPromotion")
+
+# the characters that a password must contain at least one of
+SPECIAL_CHARACTERS = frozenset("@!£$%&*#")
+
+# a hash that is checked against when the user being logged in doesn't exist, so that logging in
+# takes the same time whether or not the username is in the database.
+DUMMY_HASH = generate_password_hash("not a real password")
+
+# the key used to store the single-use login pins as HMACs. A pin only lasts until it is used, so if the key
+# isn't set in the environment a new one is made each time the server starts.
+OTP_KEY = os.environ.get("OTP_SECRET", "").encode() or secrets.token_bytes(32)
+
+
+class LRUCache:
+    """
+    LRUCache class
+
+    Holds the results of recent lookups so that they don't have to be read from the database again.
+
+    When the cache is full, the entry that was used least recently is removed.
+
+    Attributes
+    ----------
+    maxsize: int
+        The largest number of entries that the cache can hold.
+
+    Methods
+    -------
+    get(key)
+        Returns the value stored for 'key', or None if it isn't in the cache.
+
+    put(key, value)
+        Stores 'value' in the cache under 'key'.
+
+    pop(key)
+        Removes 'key' from the cache if it is there.
+
+    clear()
+        Removes every entry from the cache.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the value stored for 'key', or None if it isn't in the cache.
+
+        parameters
+        ----------
+        key:
+            The key that the value was stored under.
+
+        returns
+        --------
+        The stored value, or None.
+        """
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        """
+        Stores 'value' in the cache under 'key'.
+
+        parameters
+        ----------
+        key:
+            The key to store the value under.
+        value:
+            The value to be stored (None is never stored, as it means 'not found').
+
+        returns
+        --------
+        None
+        """
+        if value is None:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        """
+        Removes 'key' from the cache if it is there.
+
+        parameters
+        ----------
+        key:
+            The key to be removed.
+
+        returns
+        --------
+        None
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+
+        No required parameters.
+
+        returns
+        --------
+        None
+        """
+        with self.lock:
+            self.entries.clear()
+
+
+# caches of the UserTable lookups that are made on almost every request, keyed by str(UserID).
+# they are emptied by the methods that change the data they hold.
+_username_cache = LRUCache()
+_email_cache = LRUCache()
+_level_cache = LRUCache()
+_stats_cache = LRUCache()
+# the creator of each game, keyed by str(GameID). a game's creator never changes, so this is only
+# emptied when the GameUserTable is made again.
+_creator_cache = LRUCache()
+# the (GameID, UserID) pairs of users that are members of a game. users are never removed from a game,
+# so only memberships that have been found are kept.
+_member_cache = LRUCache()
+
+# the row factory (making named tuples) for each set of column names returned by a query
+_row_factories = {}
+
+# one pool is kept for each database file and shared by every table object
+_pools = {}
+_pools_lock = threading.Lock()
+# the write connection being used by each thread's open transaction (if it has one), keyed by database path
+_transactions = threading.local()
 
 
 # the main database class that is used to execute queries, and return results
@@ -28,9 +408,18 @@ class Database:
 
     Methods
     ---------
+    acquire(write: bool)
+        Lends a connection from the database's pool, to be used in a with statement.
+
+    transaction()
+        Runs every query made inside a with statement as one transaction.
+
     execute_query(sql: str, tup: tuple)
         Connects to the database and executes the SQL query passed in.
 
+    execute_many(sql: str, seq_of_tups: iterable)
+        Connects to the database and executes the SQL query once for each tuple of values, in one transaction.
+
     execute_single_response(sql: str, tup: tuple)
         Connects to the database, executes the SQL query, and returns a single row.
 
@@ -40,15 +429,85 @@ class Database:
     execute_multiple_responses(sql: str, tup: tuple))
         Connects to the database, executes the SQL query, and returns all responses.
 
+    execute_iter(sql: str, tup: tuple)
+        Connects to the database, executes the SQL query, and yields each row as it is read.
+
     drop_table(table_name: str)
         Deletes the table with the name 'table_name'
 
+    request_cached(key: tuple, load: function)
+        Returns the list made by load(), reusing it if it has already been loaded during the current request.
+
+    forget_request_cached(*keys: tuple)
+        Removes the lists stored under 'keys' for the current request, after their data has changed.
+
+    name_rows(cursor: sqlite3.Cursor)
+        Makes the rows read from the cursor named tuples, so their columns can be accessed by name.
     """
 
     def __init__(self):
         # defines the database that will be used for all queries
         self.db = "databases/website_database2.db"
 
+    def acquire(self, write=False):
+        """
+        Lends a connection from the database's pool, to be used in a with statement.
+
+        parameters
+        ----------
+        write: bool
+            True if the query will change the database, so the write connection is needed.
+
+        returns
+        --------
+        contextmanager
+        """
+        # while the thread is inside a transaction, every query (including reads, so that they can see the
+        # changes that have not been committed yet) uses the transaction's connection.
+        conn = getattr(_transactions, "conns", {}).get(self.db)
+        if conn is not None:
+            return nullcontext(conn)
+        with _pools_lock:
+            pool = _pools.get(self.db)
+            if pool is None:
+                pool = ConnectionPool(self.db)
+                _pools[self.db] = pool
+        return pool.acquire(write)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs every query made inside a with statement as one transaction.
+
+        The changes are committed together at the end (so only one sync to disk is needed),
+        or all rolled back if an error is raised. Transactions inside a transaction join the outer one.
+        The write lock is taken at the start, so anything read inside the transaction can't be changed
+        by another writer before the transaction commits.
+
+        No required parameters.
+
+        returns
+        --------
+        contextmanager
+        """
+        if not hasattr(_transactions, "conns"):
+            _transactions.conns = {}
+        if self.db in _transactions.conns:
+            yield _transactions.conns[self.db]
+            return
+        with self.acquire(True) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            _transactions.conns[self.db] = conn
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            else:
+                conn.execute("COMMIT")
+            finally:
+                del _transactions.conns[self.db]
+
     # used when something is added to/deleted from the database
     def execute_query(self, sql, tup):
         """
@@ -67,17 +526,37 @@ class Database:
         --------
         None
         """
-        with sqlite3.connect(self.db) as conn:
-            cursor = conn.cursor()
+        with self.acquire(True) as conn:
+            cursor = conn.statements.cursor(sql)
             cursor.execute(sql, tup)
-            conn.commit()
+
+    def execute_many(self, sql, seq_of_tups):
+        """
+        Connects to the database and executes the SQL query once for each tuple of values, in one transaction.
+
+        Used to add many rows at once - the query is only prepared once and only one commit is needed.
+
+        parameters
+        ---------
+        sql: str
+            the SQL query to be executed
+        seq_of_tups: iterable
+            the tuples of variables to be added into the SQL query, one for each time it is executed.
+
+        returns
+        --------
+        None
+        """
+        with self.transaction() as conn:
+            conn.executemany(sql, seq_of_tups)
 
     def execute_single_response(self, sql, tup):
         """
         Connects to the database, executes the SQL query, and returns a single row.
 
         This is used for SELECT queries, when only one returned row is expected,
-        or to just get the first result.
+        or to just get the first result. It is also used for UPDATE ... RETURNING queries,
+        which are run on the write connection.
 
         parameters
         ---------
@@ -90,10 +569,15 @@ class Database:
         --------
         tuple
         """
-        with sqlite3.connect(self.db) as db:
-            cursor = db.cursor()
+        # any query that isn't a SELECT (e.g. UPDATE ... RETURNING) changes the database
+        write = not sql.lstrip().upper().startswith("SELECT")
+        with self.acquire(write) as conn:
+            cursor = conn.cursor()
             cursor.execute(sql, tup)
+            self.name_rows(cursor)
             result = cursor.fetchone()
+            # closing the cursor finishes the statement, so the connection isn't left in the middle of it
+            cursor.close()
             return result
 
     def execute_return_id(self, sql, tup):
@@ -114,8 +598,8 @@ class Database:
         --------
         integer
         """
-        with sqlite3.connect(self.db) as db:
-            cursor = db.cursor()
+        with self.acquire(True) as conn:
+            cursor = conn.statements.cursor(sql)
             cursor.execute(sql, tup)
             return cursor.lastrowid
 
@@ -136,12 +620,72 @@ class Database:
         --------
         list
         """
-        with sqlite3.connect(self.db) as db:
-            cursor = db.cursor()
+        with self.acquire(False) as conn:
+            cursor = conn.statements.cursor(sql)
             cursor.execute(sql, tup)
+            # a cached cursor always runs the same SQL, so its rows already have the right class
+            if cursor.row_factory is None:
+                self.name_rows(cursor)
             result = cursor.fetchall()
             return result
 
+    def execute_iter(self, sql, tup):
+        """
+        Connects to the database, executes the SQL query, and yields each row as it is read.
+
+        Used instead of execute_multiple_responses when the rows are only looped over, so that
+        the whole result doesn't have to be held in a list first.
+
+        parameters
+        ----------
+        sql: str
+            the SQL query to be executed
+        tup: tuple
+            additional variables to be added into the SQL query, can be empty tuple.
+
+        returns
+        --------
+        generator
+        """
+        with self.acquire(False) as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, tup)
+                self.name_rows(cursor)
+                yield from cursor
+            finally:
+                # if the caller stops early, the statement is still finished and the connection returned
+                cursor.close()
+
+    def name_rows(self, cursor):
+        """
+        Makes the rows read from the cursor named tuples, so their columns can be accessed by name.
+
+        A named tuple is used rather than sqlite3.Row because it is still a tuple - rows can be
+        indexed, compared and sent to the browser as JSON just like before. The class is found once
+        for each query that is run, rather than for every row.
+
+        parameters
+        ----------
+        cursor: sqlite3.Cursor
+            The cursor that the query has just been executed with.
+
+        returns
+        --------
+        None
+        """
+        # queries that don't return rows (e.g. an UPDATE without RETURNING) have no description
+        if cursor.description is None:
+            return
+        fields = tuple(column[0] for column in cursor.description)
+        row_factory = _row_factories.get(fields)
+        if row_factory is None:
+            # columns without a valid name (e.g. COUNT(*)) are renamed to _0, _1, ...
+            make = namedtuple("Row", fields, rename=True)._make
+            row_factory = lambda cursor, row: make(row)
+            _row_factories[fields] = row_factory
+        cursor.row_factory = row_factory
+
     # deletes a database table
     def drop_table(self, table_name):
         """
@@ -159,6 +703,50 @@ class Database:
         sql = "DROP TABLE " + table_name
         self.execute_query(sql, ())
 
+    def request_cached(self, key, load):
+        """
+        Returns the list made by load(), reusing it if it has already been loaded during the current request.
+
+        The lists are kept in flask.g, so they are thrown away when the request (or socketio event) ends.
+        Outside of a request nothing is cached.
+
+        parameters
+        ---------
+        key: tuple
+            identifies the data being loaded, e.g. ("levels", str(userid))
+        load: function
+            called with no arguments to load the list from the database.
+
+        returns
+        --------
+        list
+        """
+        if not has_app_context():
+            return load()
+        cache = g.setdefault("db_request_cache", {})
+        if key not in cache:
+            cache[key] = tuple(load())
+        # a new list is returned each time so that the cached one can't be changed by the caller
+        return list(cache[key])
+
+    def forget_request_cached(self, *keys):
+        """
+        Removes the lists stored under 'keys' for the current request, after their data has changed.
+
+        parameters
+        ---------
+        keys: tuple
+            the keys that were passed to request_cached.
+
+        returns
+        --------
+        None
+        """
+        if has_app_context():
+            cache = g.get("db_request_cache", {})
+            for key in keys:
+                cache.pop(key, None)
+
 
 # the UserTable deals with data directly associated to the user - such as their email or password
 # A subclass of Database - meaning that all SQL queries can be executed from the parent class
@@ -190,6 +778,9 @@ class UserTable(Database):
     clear_otp(username: str)
         Ensures that an OTP cannot be used again.
 
+    hash_otp(otp: str)
+        Returns the HMAC of an OTP, which is what is stored in the database.
+
     get_email_name(username: str)
         Gets a user's email address, given their name.
 
@@ -234,6 +825,9 @@ class UserTable(Database):
 
     user_stats(userid: int)
         Returns the user's stats.
+
+    clear_cached(userid: int)
+        Removes the user's cached lookups, or every cached lookup if no user is given.
     """
 
     def __init__(self):
@@ -264,6 +858,19 @@ class UserTable(Database):
               "primary key(UserID)" \
               ")"
         self.execute_query(sql, ())
+        # indexes so that users can be found by username/email, and the leaderboard can be read
+        # in order, without scanning the whole table.
+        for index, column in (("ix_user_username", "Username"), ("ix_user_email", "EmailAddress")):
+            # usernames/emails were only checked before inserting, so an existing database could already
+            # hold duplicates - a unique index can't be created on those, so a plain index is used instead.
+            sql = "SELECT EXISTS(SELECT 1 FROM UserTable GROUP BY " + column + " HAVING COUNT(*) > 1)"
+            if self.execute_single_response(sql, ())[0]:
+                self.execute_query("CREATE INDEX IF NOT EXISTS " + index + "_dup ON UserTable(" + column + ")", ())
+            else:
+                self.execute_query("CREATE UNIQUE INDEX IF NOT EXISTS " + index + " ON UserTable(" + column + ")",
+                                   ())
+        # the leaderboard index also holds the Username, so the top 10 are read from the index alone.
+        self.execute_query("CREATE INDEX IF NOT EXISTS ix_leaderboard ON UserTable(TotalPoints DESC, Username)", ())
 
     # when the user has tried to change their details, and it is valid
     def update_data(self, values):
@@ -280,9 +887,9 @@ class UserTable(Database):
         None
         """
         username, password, email, userid = values
-        sql = "UPDATE UserTable SET Username = '" + str(username) + "', Password = '" + str(password) + \
-              "', EmailAddress = '" + str(email) + "' WHERE UserID = '" + str(userid) + "'"
-        self.execute_query(sql, ())
+        sql = "UPDATE UserTable SET Username = ?, Password = ?, EmailAddress = ? WHERE UserID = ?"
+        self.execute_query(sql, (username, password, email, userid))
+        self.clear_cached(userid)
 
     def get_user_level(self, userid):
         """
@@ -297,8 +904,12 @@ class UserTable(Database):
         --------
         integer
         """
-        sql = "SELECT UserLevel FROM UserTable WHERE UserID = '" + str(userid) + "'"
-        return self.execute_single_response(sql, ())[0]
+        level = _level_cache.get(str(userid))
+        if level is None:
+            sql = "SELECT UserLevel FROM UserTable WHERE UserID = ?"
+            level = self.execute_single_response(sql, (userid,))[0]
+            _level_cache.put(str(userid), level)
+        return level
 
     def set_otp(self, username):
         """
@@ -316,16 +927,13 @@ class UserTable(Database):
         --------
         (str, str)
         """
-        random_otp = ""
-        # creates a pseudorandom 6 digit string that will be sent to the user, and they must enter it to login
-        for num in range(6):
-            random_otp += str(random.randint(0, 9))
+        # creates a random 6 digit string that will be sent to the user, and they must enter it to login
+        random_otp = f"{secrets.randbelow(1000000):06d}"
         # updates the database to hold the correct pin
-        sql = "UPDATE UserTable SET OTP = '" + generate_password_hash(random_otp) + "' WHERE Username = '" \
-              + str(username) + "'"
-        self.execute_query(sql, ())
-        # gets the user's email so that this can be returned along with the pin to send to the user.
-        email = self.get_email_name(username)
+        # (and gets the user's email in the same query so that this can be returned along with the pin to send to
+        # the user).
+        sql = "UPDATE UserTable SET OTP = ? WHERE Username = ? RETURNING EmailAddress"
+        email = self.execute_single_response(sql, (self.hash_otp(random_otp), username))[0]
         return random_otp, email
 
     def login_otp(self, username, otp):
@@ -344,21 +952,37 @@ class UserTable(Database):
         boolean
         """
         # gets the user's current pin as stored in the database
-        sql = "SELECT OTP FROM UserTable WHERE Username = '" + str(username) + "'"
-        response = self.execute_single_response(sql, ())
-        if not response:
-            # i.e. the username doesn't exist
-            return False
+        sql = "SELECT OTP FROM UserTable WHERE Username = ?"
+        response = self.execute_single_response(sql, (username,))
+        # the OTP is 0 (stored as an integer) when the user has no valid pin, e.g. after it has been used
+        if response is None or not isinstance(response[0], str):
+            stored = ""
         else:
-            # if the user has a valid pin stored in the database
-            if str(otp) != "0":
-                # checks whether the pin stored in the database is the same as the pin that has been entered
-                # (the pin is hashed in the database for security)
-                if check_password_hash(response[0], otp):
-                    # the user can be logged in
-                    return True
-            # the user is can't be logged in
-            return False
+            stored = response[0]
+        # checks whether the pin stored in the database is the same as the pin that has been entered
+        # (the pin is stored as an HMAC for security). This is done even when there is no pin to check
+        # against, so that it takes the same time either way.
+        matches = hmac.compare_digest(self.hash_otp(otp), stored)
+        # '0' is never accepted as a pin
+        return matches and not hmac.compare_digest(str(otp), "0")
+
+    def hash_otp(self, otp):
+        """
+        Returns the HMAC of an OTP, which is what is stored in the database.
+
+        A single SHA-256 HMAC is used rather than a slow password hash, as the pin is
+        random and can only be used once.
+
+        Parameters
+        ---------
+        otp: str
+            The OTP to be hashed.
+
+        returns
+        --------
+        str
+        """
+        return hmac.new(OTP_KEY, str(otp).encode(), "sha256").hexdigest()
 
     def clear_otp(self, username):
         """
@@ -378,11 +1002,9 @@ class UserTable(Database):
         """
         # when the user has logged in using the pin, the pin is reset to be '0' which is not accepted when
         # a user tries to login with it. This ensures that the user cannot log in more than once with the same pin
-        sql = "UPDATE UserTable SET OTP = '" + str(0) + "' WHERE Username = '" + username + "'"
-        self.execute_query(sql, ())
-        # gets the user's id and email to return to log in the user's session
-        sql = "SELECT UserID, EmailAddress FROM UserTable WHERE Username = '" + username + "'"
-        return self.execute_single_response(sql, ())
+        # the user's id and email are returned by the same query to log in the user's session
+        sql = "UPDATE UserTable SET OTP = 0 WHERE Username = ? RETURNING UserID, EmailAddress"
+        return self.execute_single_response(sql, (username,))
 
     def get_email_name(self, username):
         """
@@ -398,8 +1020,8 @@ class UserTable(Database):
         str
         """
 
-        sql = "SELECT EmailAddress FROM UserTable WHERE Username = '" + str(username) + "'"
-        return self.execute_single_response(sql, ())[0]
+        sql = "SELECT EmailAddress FROM UserTable WHERE Username = ?"
+        return self.execute_single_response(sql, (username,))[0]
 
     def get_email(self, user_id):
         """
@@ -414,9 +1036,12 @@ class UserTable(Database):
         --------
         str
         """
-        sql = "SELECT EmailAddress FROM UserTable WHERE UserID = '" + str(user_id) + "'"
-        result = self.execute_single_response(sql, ())
-        return result[0]
+        email = _email_cache.get(str(user_id))
+        if email is None:
+            sql = "SELECT EmailAddress FROM UserTable WHERE UserID = ?"
+            email = self.execute_single_response(sql, (user_id,))[0]
+            _email_cache.put(str(user_id), email)
+        return email
 
     def leaderboard(self):
         """
@@ -428,7 +1053,7 @@ class UserTable(Database):
         --------
         list
         """
-        sql = "SELECT Username, TotalPoints FROM UserTable ORDER BY TotalPoints DESC LIMIT 10"
+        sql = "SELECT Username, TotalPoints FROM UserTable ORDER BY TotalPoints DESC, Username LIMIT 10"
         result = self.execute_multiple_responses(sql, ())
         return result
 
@@ -448,9 +1073,12 @@ class UserTable(Database):
         None.
         """
         # adds the points that a user has earned while playing a round of a game
-        sql = "UPDATE UserTable SET TotalPoints = TotalPoints + '" + str(points) + "' WHERE UserID = '" + str(
-            user) + "'"
-        self.execute_query(sql, ())
+        sql = "UPDATE UserTable SET TotalPoints = TotalPoints + ? WHERE UserID = ?"
+        self.execute_query(sql, (points, user))
+        # inside a transaction, another thread could cache the old points again before they are committed,
+        # so the caller removes the cached stats once the transaction has finished instead.
+        if self.db not in getattr(_transactions, "conns", {}):
+            _stats_cache.pop(str(user))
 
     def username_exists(self, username):
         """
@@ -465,8 +1093,8 @@ class UserTable(Database):
         --------
         Boolean
         """
-        sql = "SELECT * FROM UserTable WHERE Username = '" + str(username) + "'"
-        result = self.execute_single_response(sql, ())
+        sql = "SELECT 1 FROM UserTable WHERE Username = ? LIMIT 1"
+        result = self.execute_single_response(sql, (username,))
         # return whether a row was returned or not
         if result:
             return True
@@ -486,8 +1114,8 @@ class UserTable(Database):
         --------
         Boolean
         """
-        sql = "SELECT * FROM UserTable WHERE EmailAddress = '" + email + "'"
-        response = self.execute_single_response(sql, ())
+        sql = "SELECT 1 FROM UserTable WHERE EmailAddress = ? LIMIT 1"
+        response = self.execute_single_response(sql, (email,))
         if response:
             return True
         else:
@@ -507,12 +1135,11 @@ class UserTable(Database):
         --------
         int
         """
-        sql = "SELECT UserID FROM UserTable WHERE Username = '" + username + "'"
-        user_id = self.execute_single_response(sql, ())
-        try:
-            return user_id[0]
-        except:
+        sql = "SELECT UserID FROM UserTable WHERE Username = ?"
+        user_id = self.execute_single_response(sql, (username,))
+        if user_id is None:
             return 0
+        return user_id[0]
 
     def find_username(self, user):
         """
@@ -528,12 +1155,15 @@ class UserTable(Database):
         -------
         str
         """
-        sql = "SELECT Username FROM UserTable WHERE UserID = '" + str(user) + "'"
-        result = self.execute_single_response(sql, ())
-        try:
-            return result[0]
-        except:
-            return ""
+        username = _username_cache.get(str(user))
+        if username is None:
+            sql = "SELECT Username FROM UserTable WHERE UserID = ?"
+            result = self.execute_single_response(sql, (user,))
+            if result is None:
+                return ""
+            username = result[0]
+            _username_cache.put(str(user), username)
+        return username
 
     def validate_password(self, password):
         """
@@ -551,16 +1181,12 @@ class UserTable(Database):
         tuple[bool, list]
         """
         message = []
-        char = False
         # Checks password length
         if len(password) > 7:
             # checks for special characters.
-            for character in "@!£$%&*#":
-                if character in password:
-                    char = True
-            if char:
+            if not SPECIAL_CHARACTERS.isdisjoint(password):
                 # Checks if there are different cases of letters.
-                if password.lower() != password and password.upper() != password:
+                if any(c.isupper() for c in password) and any(c.islower() for c in password):
                     # the password is valid - the message will be empty.
                     return True, message
                 else:
@@ -620,6 +1246,8 @@ class UserTable(Database):
         sql = "INSERT INTO UserTable(Username, Password, EmailAddress, " \
               "TotalPoints, GoldPieces, EmailPermission, UserLevel, UserStreak, OTP) VALUES (?,?,?,?,?,?,?,?,?)"
         self.execute_query(sql, values)
+        # the new account may reuse the UserID of an account that was deleted
+        self.clear_cached()
 
     def validate_login(self, user, password):
         """
@@ -636,10 +1264,12 @@ class UserTable(Database):
         -------
         bool
         """
-        sql = "SELECT Password FROM UserTable WHERE Username = '" + str(user) + "'"
-        response = self.execute_single_response(sql, ())
+        sql = "SELECT Password FROM UserTable WHERE Username = ?"
+        response = self.execute_single_response(sql, (user,))
         if not response:
-            # if the username doesn't exist
+            # if the username doesn't exist - the dummy hash is still checked so that this takes
+            # as long as checking a real password.
+            check_password_hash(DUMMY_HASH, password)
             return False
         else:
             if check_password_hash(response[0], password):
@@ -660,8 +1290,8 @@ class UserTable(Database):
         -------
         int
         """
-        sql = "SELECT TotalPoints FROM UserTable WHERE UserID = '" + str(user_id) + "'"
-        result = self.execute_single_response(sql, ())[0]
+        sql = "SELECT TotalPoints FROM UserTable WHERE UserID = ?"
+        result = self.execute_single_response(sql, (user_id,))[0]
         return result
 
     def delete_users(self, username):
@@ -675,8 +1305,9 @@ class UserTable(Database):
         -------
         None
         """
-        sql = "DELETE FROM UserTable WHERE Username = '" + str(username) + "' OR Username = 'user6'"
-        self.execute_query(sql, ())
+        sql = "DELETE FROM UserTable WHERE Username = ? OR Username = 'user6'"
+        self.execute_query(sql, (username,))
+        self.clear_cached()
 
     def user_stats(self, userid):
         """
@@ -689,11 +1320,36 @@ class UserTable(Database):
 
         returns
         -------
-        tuple[int, int, int, int]
+        tuple[int, int, int, int] (a named tuple - TotalPoints, GoldPieces, UserLevel, UserStreak)
+        """
+        stats = _stats_cache.get(str(userid))
+        if stats is None:
+            sql = "SELECT TotalPoints, GoldPieces, UserLevel, UserStreak FROM UserTable WHERE UserID = ?"
+            # the row can be used as a tuple, or its columns accessed by name (e.g. stats.TotalPoints)
+            stats = self.execute_single_response(sql, (userid,))
+            _stats_cache.put(str(userid), stats)
+        return stats
+
+    def clear_cached(self, userid=None):
+        """
+        Removes the user's cached lookups, or every cached lookup if no user is given.
+
+        This is called whenever the user's record in the UserTable is changed.
+
+        parameters
+        ----------
+        userid: int
+            The UserID of the user whose record has changed, defaults to None (all users).
+
+        returns
+        -------
+        None
         """
-        sql = "SELECT TotalPoints, GoldPieces, UserLevel, UserStreak FROM UserTable WHERE UserID = '" + str(
-            userid) + "'"
-        return self.execute_single_response(sql, ())
+        for cache in (_username_cache, _email_cache, _level_cache, _stats_cache):
+            if userid is None:
+                cache.clear()
+            else:
+                cache.pop(str(userid))
 
 
 # this class manages the relationships between users
@@ -713,6 +1369,9 @@ class FriendsTable(UserTable):
     add_request(requested: int, received: int)
         Adds a record to the table, indicating a new friend request.
 
+    add_requests(pairs: list)
+        Adds a friend request for each pair of users, in one transaction.
+
     accept_request(requested: int, received: int)
         Sets Accepted to be True in the friend record between these two users.
 
@@ -756,6 +1415,12 @@ class FriendsTable(UserTable):
               "foreign key(UserReceived) references UserTable(UserID)" \
               ")"
         self.execute_query(sql, ())
+        # indexes so that a user's friends and friend requests can be found from either side of the request.
+        # each one also holds the other user's ID, so the friend lookups never have to read the table itself.
+        self.execute_query("CREATE INDEX IF NOT EXISTS ix_friends_requested_cover "
+                           "ON FriendsTable(UserRequested, Accepted, UserReceived)", ())
+        self.execute_query("CREATE INDEX IF NOT EXISTS ix_friends_received_cover "
+                           "ON FriendsTable(UserReceived, Accepted, UserRequested)", ())
 
     def add_request(self, requested, received):
         """
@@ -779,6 +1444,28 @@ class FriendsTable(UserTable):
             tup = (requested, received, False)
             self.execute_query(sql, tup)
 
+    def add_requests(self, pairs):
+        """
+        Adds a friend request for each pair of users, in one transaction.
+
+        As with add_request, no request is added between users that are already friends.
+
+        Parameters
+        ----------
+        pairs: list[tuple[int, int]]
+            The (requested, received) UserIDs of each friend request.
+
+        returns
+        -------
+        None
+        """
+        sql = "INSERT INTO FriendsTable(UserRequested, UserReceived, Accepted) " \
+              "SELECT ?, ?, False WHERE NOT EXISTS(SELECT 1 FROM FriendsTable " \
+              "WHERE ((UserRequested = ? AND UserReceived = ?) OR (UserRequested = ? AND UserReceived = ?)) " \
+              "AND Accepted = True)"
+        self.execute_many(sql, ((requested, received, requested, received, received, requested)
+                                for requested, received in pairs))
+
     def accept_request(self, requested, received):
         """
         Sets Accepted to be True in the friend record between these two users.
@@ -796,9 +1483,8 @@ class FriendsTable(UserTable):
         """
         # finds the specific row where the user sending the request and the user receiving the
         # request - then sets the Accepted column to True - the users are now friends.
-        sql = "UPDATE FriendsTable SET Accepted = True " \
-              "WHERE UserRequested = " + str(requested) + " AND UserReceived = " + str(received)
-        self.execute_query(sql, ())
+        sql = "UPDATE FriendsTable SET Accepted = True WHERE UserRequested = ? AND UserReceived = ?"
+        self.execute_query(sql, (requested, received))
 
     def reject_request(self, requested, received):
         """
@@ -818,9 +1504,8 @@ class FriendsTable(UserTable):
         """
         # When the user rejects a request, the row in the friends table is deleted when the user requested
         # and received matches the requests.
-        sql = "DELETE FROM FriendsTable WHERE UserRequested = '" + \
-              str(requested) + "' AND UserReceived = '" + str(received) + "'"
-        self.execute_query(sql, ())
+        sql = "DELETE FROM FriendsTable WHERE UserRequested = ? AND UserReceived = ?"
+        self.execute_query(sql, (requested, received))
 
     def find_all_requested(self, user):
         """
@@ -839,8 +1524,8 @@ class FriendsTable(UserTable):
         sql = "SELECT FriendsTable.UserRequested, UserTable.Username " \
               "FROM FriendsTable " \
               "INNER JOIN UserTable ON UserTable.UserID = FriendsTable.UserRequested " \
-              "WHERE FriendsTable.UserReceived = '" + str(user) + "' AND Accepted = False"
-        requested_users = self.execute_multiple_responses(sql, ())
+              "WHERE FriendsTable.UserReceived = ? AND Accepted = False"
+        requested_users = self.execute_multiple_responses(sql, (user,))
         return requested_users
 
     def get_similar_users(self, username, userid):
@@ -859,17 +1544,15 @@ class FriendsTable(UserTable):
         --------
         list[tuple[int, str]]
         """
-        # gets all users with a username that contains 'username' as searched by the user.
-        sql = "SELECT UserID, Username FROM UserTable WHERE Username LIKE '%" + username + "%' LIMIT 8"
-        results = self.execute_multiple_responses(sql, ())
-        friends = self.get_user_friends(userid)
-        results = set(results)
-        # gets only the users that the user is not already friends with
-        overlap = list(results.intersection(friends))
-        results = list(results)
-        for item in overlap:
-            results.remove(item)
-        return results
+        # gets the users with a username that contains 'username' as searched by the user,
+        # leaving out the user themself and any users that they are already friends with.
+        sql = "SELECT UserID, Username FROM UserTable WHERE Username LIKE ? AND UserID != ? " \
+              "AND UserID NOT IN (" \
+              "SELECT UserReceived FROM FriendsTable WHERE UserRequested = ? AND Accepted = True " \
+              "UNION " \
+              "SELECT UserRequested FROM FriendsTable WHERE UserReceived = ? AND Accepted = True) " \
+              "LIMIT 8"
+        return self.execute_multiple_responses(sql, ("%" + username + "%", userid, userid, userid))
 
     def get_user_friends(self, user, just_ids=False):
         """
@@ -887,31 +1570,21 @@ class FriendsTable(UserTable):
         -------
         List[tuple[int, str]]
         """
-        # gets all of the users that the user is friends with (where the user made the friend request)
-        sql = "SELECT UserReceived FROM FriendsTable where UserRequested = '" + str(user) + "' AND Accepted = True"
-        tmp = self.execute_multiple_responses(sql, ())
-        found = []
-        for friend in tmp:
-            friend_id = friend[0]
-            # if the program needs to return the username as well as ids, added as a tuple
-            if not just_ids:
-                found.append((friend_id, self.find_username(friend_id)))
-            else:
-                found.append(friend_id)
-        # gets all of the users that the user is friends with (where the user didn't make the friend request)
-        sql = "SELECT UserRequested FROM FriendsTable where UserReceived = '" + str(user) + "' AND Accepted = True"
-        tmp = self.execute_multiple_responses(sql, ())
-        for friend in tmp:
-            # the UserID of the friend
-            friend_id = friend[0]
-            if not just_ids:
-                # adds the tuple with the friend's UserID and Username
-                found.append((friend_id, self.find_username(friend_id)))
-            else:
-                found.append(friend_id)
-
-        # returns a list of all the found users.
-        return found
+        if just_ids:
+            # gets the UserIDs of the user's friends, from requests that they made and requests that they received
+            sql = "SELECT UserReceived FROM FriendsTable WHERE UserRequested = ? AND Accepted = True " \
+                  "UNION ALL " \
+                  "SELECT UserRequested FROM FriendsTable WHERE UserReceived = ? AND Accepted = True"
+            return [friend[0] for friend in self.execute_iter(sql, (user, user))]
+        # gets the UserID and Username of each friend in one query, rather than looking up each username separately
+        sql = "SELECT UserTable.UserID, UserTable.Username FROM FriendsTable " \
+              "INNER JOIN UserTable ON UserTable.UserID = FriendsTable.UserReceived " \
+              "WHERE FriendsTable.UserRequested = ? AND FriendsTable.Accepted = True " \
+              "UNION ALL " \
+              "SELECT UserTable.UserID, UserTable.Username FROM FriendsTable " \
+              "INNER JOIN UserTable ON UserTable.UserID = FriendsTable.UserRequested " \
+              "WHERE FriendsTable.UserReceived = ? AND FriendsTable.Accepted = True"
+        return self.execute_multiple_responses(sql, (user, user))
 
     def check_friends(self, other_user, you):
         """
@@ -929,26 +1602,11 @@ class FriendsTable(UserTable):
         bool
         """
         # when a user tries to access the page of another user, they must first check whether the users are friends
-        other_user = str(other_user)
-        you = str(you)
-        # checks whether the user made a request to the user and it has been accepted
-        sql = "SELECT * FROM FriendsTable where UserRequested = '" + other_user + "' AND UserReceived = '" \
-              + you + "' AND Accepted = True"
-        tmp = self.execute_single_response(sql, ())
-        result = tmp
-        if tmp is None:
-            # if nothing was found in the first case, checks whether the other user had made a request
-            # to the user that was accepted
-            sql = "SELECT * FROM FriendsTable where UserReceived = '" + other_user + "' AND UserRequested = '" \
-                  + you + "' AND Accepted = True"
-            result = self.execute_single_response(sql, ())
-
-        if result is None:
-            # if the users are not friends
-            return False
-        else:
-            # if the users are friends
-            return True
+        # checks whether either user made a request to the other that has been accepted, in one query
+        sql = "SELECT EXISTS(SELECT 1 FROM FriendsTable " \
+              "WHERE ((UserRequested = ? AND UserReceived = ?) OR (UserRequested = ? AND UserReceived = ?)) " \
+              "AND Accepted = True)"
+        return bool(self.execute_single_response(sql, (other_user, you, you, other_user))[0])
 
 
 class EmailSettingTable(UserTable):
@@ -998,6 +1656,8 @@ class EmailSettingTable(UserTable):
               "foreign key(UserID) references UserTable(UserID)" \
               ")"
         self.execute_query(sql, ())
+        # a user's email settings are found by their UserID
+        self.execute_query("CREATE INDEX IF NOT EXISTS ix_email_settings_user ON EmailSettingTable(UserID)", ())
 
     def new_row(self, userid):
         """
@@ -1036,9 +1696,8 @@ class EmailSettingTable(UserTable):
         None
         """
         # when the user changes their settings, the table is updated to reflect their preferences
-        sql = "UPDATE EmailSettingTable SET EmailReminders = " + str(values[0]) + ", EmailInfo = " \
-              + str(values[1]) + ", EmailPromotion = " + str(values[2]) + " WHERE UserID = " + str(userid)
-        self.execute_query(sql, ())
+        sql = "UPDATE EmailSettingTable SET EmailReminders = ?, EmailInfo = ?, EmailPromotion = ? WHERE UserID = ?"
+        self.execute_query(sql, (values[0], values[1], values[2], userid))
 
     def checked(self, field, userid):
         """
@@ -1055,11 +1714,35 @@ class EmailSettingTable(UserTable):
         -------
         bool
         """
-        sql = "SELECT " + field + " FROM EmailSettingTable WHERE UserID = " + str(userid)
-        result = self.execute_single_response(sql, ())[0]
+        # a column name can't be passed as a parameter, so only the known email fields are allowed
+        if field not in EMAIL_FIELDS:
+            raise ValueError("Unknown email setting: " + str(field))
+        sql = "SELECT " + field + " FROM EmailSettingTable WHERE UserID = ?"
+        result = self.execute_single_response(sql, (userid,))[0]
         return result
 
 
+# the awards that are added to the AwardsTable by create_records:
+# (AwardDescription, PointsNeeded, StreakNeeded, LevelNeeded, RewardGold, RewardPoints)
+AWARDS_SEED = (
+    ("You earned 100 Points!", 100, 0, 0, 10, 100),
+    ("You earned 500 Points!", 500, 0, 0, 20, 200),
+    ("You earned 1000 Points!", 1000, 0, 0, 23, 300),
+    ("You earned 2000 Points!", 2000, 0, 0, 40, 400),
+    ("You earned 5000 Points!", 5000, 0, 0, 50, 500),
+    ("You kept a 1 day streak!", 0, 1, 0, 10, 100),
+    ("You kept a 7 day streak!", 0, 7, 0, 20, 200),
+    ("You kept a 14 day streak!", 0, 14, 0, 30, 300),
+    ("You kept a 28 day streak!", 0, 28, 0, 40, 400),
+    ("You kept a 365 day streak!", 0, 365, 0, 50, 500),
+    ("You completed level 1!", 0, 0, 1, 10, 100),
+    ("You completed level 2!", 0, 0, 2, 20, 200),
+    ("You completed level 3!", 0, 0, 3, 30, 300),
+    ("You completed level 4!", 0, 0, 4, 40, 400),
+    ("You completed level 5!", 0, 0, 5, 50, 500),
+)
+
+
 class AwardsTable(Database):
     """
     AwardsTable Class
@@ -1102,6 +1785,8 @@ class AwardsTable(Database):
               "primary key(AwardID)" \
               ")"
         self.execute_query(sql, ())
+        # lets the awards be read in order of value without sorting them
+        self.execute_query("CREATE INDEX IF NOT EXISTS ix_awards_points ON AwardsTable(RewardPoints)", ())
 
     def create_records(self):
         """
@@ -1113,22 +1798,11 @@ class AwardsTable(Database):
         -------
         None
         """
-        description = ["You earned 100 Points!", "You earned 500 Points!", "You earned 1000 Points!",
-                       "You earned 2000 Points!", "You earned 5000 Points!", "You kept a 1 day streak!",
-                       "You kept a 7 day streak!", "You kept a 14 day streak!", "You kept a 28 day streak!",
-                       "You kept a 365 day streak!", "You completed level 1!", "You completed level 2!",
-                       "You completed level 3!", "You completed level 4!", "You completed level 5!"]
-        points = [100, 500, 1000, 2000, 5000, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-        streak = [0, 0, 0, 0, 0, 1, 7, 14, 28, 365, 0, 0, 0, 0, 0]
-        level = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 2, 3, 4, 5]
-        reward_gold = [10, 20, 23, 40, 50, 10, 20, 30, 40, 50, 10, 20, 30, 40, 50]
-        reward_point = [100, 200, 300, 400, 500, 100, 200, 300, 400, 500, 100, 200, 300, 400, 500]
-        # populating the table with the values defined above - each with descriptions, requirements and rewards
-        for x in range(len(points)):
-            sql = "INSERT INTO AwardsTable(AwardDescription, PointsNeeded, StreakNeeded, " \
-                  "LevelNeeded, RewardGold, RewardPoints) VALUES (?,?,?,?,?,?)"
-            tup = (description[x], points[x], streak[x], level[x], reward_gold[x], reward_point[x])
-            self.execute_query(sql, tup)
+        # populating the table with the awards defined in AWARDS_SEED - each with descriptions, requirements and
+        # rewards (all of the rows are added by one statement, in one transaction)
+        sql = "INSERT INTO AwardsTable(AwardDescription, PointsNeeded, StreakNeeded, " \
+              "LevelNeeded, RewardGold, RewardPoints) VALUES (?,?,?,?,?,?)"
+        self.execute_many(sql, AWARDS_SEED)
 
     def award_details(self, award):
         """
@@ -1144,8 +1818,8 @@ class AwardsTable(Database):
         str
         """
         # selects the description of the award based on its id
-        sql = "SELECT AwardDescription FROM AwardsTable WHERE AwardID = '" + str(award) + "'"
-        result = self.execute_single_response(sql, ())[0]
+        sql = "SELECT AwardDescription FROM AwardsTable WHERE AwardID = ?"
+        result = self.execute_single_response(sql, (award,))[0]
         return result
 
 
@@ -1195,6 +1869,9 @@ class UserAwardsTable(AwardsTable, UserTable):
               "foreign key(AwardID) references AwardsTable(AwardID)" \
               ")"
         self.execute_query(sql, ())
+        # the user's awards are found from the index alone, and a user can only be given each award once
+        self.execute_query("CREATE UNIQUE INDEX IF NOT EXISTS ix_user_awards_unique "
+                           "ON UserAwardsTable(UserID, AwardID)", ())
 
     def get_user_awards(self, userid):
         """
@@ -1211,13 +1888,13 @@ class UserAwardsTable(AwardsTable, UserTable):
         """
         # before finding the awards, update them to check that the user hasn't earned more
         self.check_awards(userid)
-        # finds the list of awards that the user has
-        awards = self.get_award_ids(userid, True)
-        name_list = []
-        for item in awards:
-            name_list.append(self.award_details(item))
+        # finds the names of the user's 3 most valuable awards in one query
+        sql = "SELECT AwardsTable.AwardDescription FROM UserAwardsTable " \
+              "INNER JOIN AwardsTable ON AwardsTable.AwardID = UserAwardsTable.AwardID " \
+              "WHERE UserAwardsTable.UserID = ? " \
+              "ORDER BY AwardsTable.RewardPoints DESC, AwardsTable.AwardID LIMIT 3"
         # returns the list of names of the awards that the user has earned
-        return name_list
+        return [item[0] for item in self.execute_iter(sql, (userid,))]
 
     def get_award_ids(self, userid, limit=False):
         """
@@ -1234,49 +1911,17 @@ class UserAwardsTable(AwardsTable, UserTable):
         -------
         list[int]
         """
-        # gets the IDs of the awards that the user has earned so far, to be used for processing
-        sql = "SELECT AwardID FROM UserAwardsTable WHERE UserID = '" + str(userid) + "'"
-        got_award_list = self.execute_multiple_responses(sql, ())
-        # if there isn't a limit to how many results can be returned
         if not limit:
-            # adds all of the AwardIDs to the list and returns it
-            award_list = []
-            for item in got_award_list:
-                award_list.append(item[0])
-            return award_list
+            # gets the IDs of all of the awards that the user has earned so far
+            sql = "SELECT AwardID FROM UserAwardsTable WHERE UserID = ?"
         else:
-            # orders all of the awards in the database by value highest to lowest.
-            sql = "SELECT AwardID FROM AwardsTable ORDER BY RewardPoints DESC"
-            award_list = self.execute_multiple_responses(sql, ())
-            # if the number of awards that the user has is > 3
-            if len(got_award_list) > 3:
-                value_dict = {}
-                for item in got_award_list:
-                    # new key: AwardID, value: rank of award
-                    value_dict[item[0]] = award_list.index(item)
-
-                to_return = []
-                # get top 3 awards
-                for x in range(3):
-                    # sets smallest to a large number that a rank cannot be bigger than.
-                    smallest = 100000
-                    smallest_id = 0
-                    # find the lowest rank number in the value_dict
-                    for award in value_dict:
-                        if value_dict[award] < smallest:
-                            # smallest is the current smallest rank number
-                            smallest = value_dict[award]
-                            smallest_id = award
-                    # add the ID of the best award in the dictionary to the values to return
-                    to_return.append(smallest_id)
-                    # removes it from the dictionary so it can't be picked again
-                    value_dict.pop(smallest_id)
-                return to_return
-            lst = []
-            for item in got_award_list:
-                lst.append(item[0])
-            got_award_list = lst
-            return got_award_list
+            # gets the IDs of the user's 3 most valuable awards
+            sql = "SELECT AwardsTable.AwardID FROM UserAwardsTable " \
+                  "INNER JOIN AwardsTable ON AwardsTable.AwardID = UserAwardsTable.AwardID " \
+                  "WHERE UserAwardsTable.UserID = ? " \
+                  "ORDER BY AwardsTable.RewardPoints DESC, AwardsTable.AwardID LIMIT 3"
+        return self.request_cached(("award_ids", str(userid), bool(limit)),
+                                   lambda: [item[0] for item in self.execute_iter(sql, (userid,))])
 
     # this function checks whether the user has earned any new awards
     def check_awards(self, userid):
@@ -1291,32 +1936,16 @@ class UserAwardsTable(AwardsTable, UserTable):
         -------
         None
         """
-        # gets the current stats and points for the user
-        current_stats = self.user_stats(userid)
-        c_points, c_gold, c_level, c_streak = current_stats
-        current = self.get_award_ids(userid)
-        current_ids = []
-        for item in current:
-            current_ids.append(item)
-        # gets all of the awards from the awards table and their requirements
-        sql = "SELECT AwardID, PointsNeeded, StreakNeeded, LevelNeeded FROM AwardsTable"
-        all_awards = self.execute_multiple_responses(sql, ())
-        awards_to_add = []
-        # for each award
-        for award in all_awards:
-            id_, points, streak, level = award
-            # if the user doesn't already have the award
-            if id_ not in current_ids:
-                # if the user meets all of the requirements...
-                if c_points >= points:
-                    if c_level >= level:
-                        if c_streak >= streak:
-                            awards_to_add.append(id_)
-        # for each of the awards that have to be added
-        for awd in awards_to_add:
-            tup = (userid, awd, str(round(time.time())))
-            sql = "INSERT INTO UserAwardsTable(UserID, AwardID, AwardDate) VALUES (?,?,?)"
-            self.execute_query(sql, tup)
+        # adds every award that the user meets all of the requirements for (using their current points, level
+        # and streak) in one query - the unique index means any award they already have is skipped.
+        sql = "INSERT OR IGNORE INTO UserAwardsTable(UserID, AwardID, AwardDate) " \
+              "SELECT ?, AwardsTable.AwardID, ? FROM AwardsTable " \
+              "INNER JOIN UserTable ON UserTable.UserID = ? " \
+              "WHERE AwardsTable.PointsNeeded <= UserTable.TotalPoints " \
+              "AND AwardsTable.LevelNeeded <= UserTable.UserLevel " \
+              "AND AwardsTable.StreakNeeded <= UserTable.UserStreak"
+        self.execute_query(sql, (userid, round(time.time()), userid))
+        self.forget_request_cached(("award_ids", str(userid), False), ("award_ids", str(userid), True))
 
 
 class UserLevelsTable(UserTable):
@@ -1365,6 +1994,8 @@ class UserLevelsTable(UserTable):
               "foreign key(LevelID) references LevelsTable(LevelID)" \
               ")"
         self.execute_query(sql, ())
+        # each level can only be recorded once for each user
+        self.execute_query("CREATE UNIQUE INDEX IF NOT EXISTS ix_user_levels ON UserLevelsTable(UserID, LevelID)", ())
 
     def finish_level(self, userid, level_complete):
         """
@@ -1386,21 +2017,19 @@ class UserLevelsTable(UserTable):
         """
         # when the user has completed a level
         # adds the level to the user's completed levels
-        current_levels = self.get_levels(userid)
-        if level_complete not in current_levels:
-            sql = "INSERT INTO UserLevelsTable(UserID, LevelID, DateCompleted) VALUES (?,?,?)"
-            tup = (userid, level_complete, str(round(time.time())))
-            self.execute_query(sql, tup)
-        # updates the user's level to be the most recent one completed
-        max_level = max(self.get_levels(userid))
-        sql = "UPDATE UserTable SET UserLevel = '" + str(max_level) + "' WHERE UserID = '" + str(userid) + "'"
-        self.execute_query(sql, ())
         level_complete = int(level_complete)
         add_points = level_complete * 10
-        # adds points to the user's total
-        sql = "UPDATE UserTable SET TotalPoints = TotalPoints + '" + str(add_points) + "' WHERE UserID = '" \
-              + str(userid) + "'"
-        self.execute_query(sql, ())
+        with self.transaction():
+            # (the unique index means nothing is added if the user has already completed the level)
+            sql = "INSERT OR IGNORE INTO UserLevelsTable(UserID, LevelID, DateCompleted) VALUES (?,?,?)"
+            tup = (userid, level_complete, str(round(time.time())))
+            self.execute_query(sql, tup)
+            # updates the user's level to be the highest one completed, and adds points to the user's total
+            sql = "UPDATE UserTable SET UserLevel = MAX(UserLevel, ?), TotalPoints = TotalPoints + ? WHERE UserID = ?"
+            self.execute_query(sql, (level_complete, add_points, userid))
+        # the cached lookups are removed once the changes are committed
+        self.clear_cached(userid)
+        self.forget_request_cached(("levels", str(userid)), ("allowed_chars", str(userid)))
 
     def get_levels(self, userid):
         """
@@ -1415,12 +2044,9 @@ class UserLevelsTable(UserTable):
         -------
         list[int]
         """
-        sql = "SELECT LevelID FROM UserLevelsTable WHERE UserID = '" + str(userid) + "'"
-        result = self.execute_multiple_responses(sql, ())
-        returns = []
-        for item in result:
-            returns.append(item[0])
-        return returns
+        sql = "SELECT LevelID FROM UserLevelsTable WHERE UserID = ?"
+        return self.request_cached(("levels", str(userid)),
+                                   lambda: [item[0] for item in self.execute_iter(sql, (userid,))])
 
     def get_allowed_chars(self, userid):
         """
@@ -1436,16 +2062,13 @@ class UserLevelsTable(UserTable):
         list[int]
         """
         # gets the CharIDs of the characters that are in the levels that the user has completed.
-        sql = "SELECT CharTable.CharID " \
+        # (DISTINCT means each character is only returned once)
+        sql = "SELECT DISTINCT CharTable.CharID " \
               "FROM UserLevelsTable " \
               "INNER JOIN CharTable ON UserLevelsTable.LevelID = CharTable.CharLevel " \
-              "WHERE UserLevelsTable.UserID = '" + str(userid) + "'"
-        result = self.execute_multiple_responses(sql, ())
-        returns = []
-        for item in result:
-            if item[0] not in returns:
-                returns.append(item[0])
-        return returns
+              "WHERE UserLevelsTable.UserID = ?"
+        return self.request_cached(("allowed_chars", str(userid)),
+                                   lambda: [item[0] for item in self.execute_iter(sql, (userid,))])
 
 
 class LevelsTable(Database):
@@ -1503,8 +2126,6 @@ class LevelsTable(Database):
         -------
         None
         """
-        self.drop_table("LevelsTable")
-        self.create_table()
         # some primitive text to populate the levels table. In a real situation where this app is used,
         # a lot more data would be added to aide the user's learning
         levels = {"Level 1": "In this lesson you will learn the characters　ん,あ,い,う,え and お."
@@ -1531,13 +2152,13 @@ class LevelsTable(Database):
                              "//This is where the first part of lesson content will be.//Some more info.//Final notes.",
                   "Level 9": "In this lesson you will learn the characters ら,り,る,れ and ろ"
                              "//This is where the first part of lesson content will be.//Some more info.//Final notes."}
-        points = 0
-        # for each of the levels, add it to the database
-        for level in levels:
-            points += 10
-            sql = "INSERT INTO LevelsTable(LevelName, LevelText, LevelPoints) VALUES (?,?,?)"
-            tup = (level, levels[level], points)
-            self.execute_query(sql, tup)
+        # the table is reset and all of the levels are added to it in one transaction, so it is never seen
+        # empty (or missing) - each level is worth 10 more points than the one before
+        sql = "INSERT INTO LevelsTable(LevelName, LevelText, LevelPoints) VALUES (?,?,?)"
+        with self.transaction():
+            self.drop_table("LevelsTable")
+            self.create_table()
+            self.execute_many(sql, ((level, levels[level], (num + 1) * 10) for num, level in enumerate(levels)))
 
     def get_level_stuff(self, level):
         """
@@ -1553,8 +2174,8 @@ class LevelsTable(Database):
         tuple[str, int]
         """
         # get all of the information for the level and return it
-        sql = "SELECT LevelText, LevelPoints FROM LevelsTable WHERE LevelID = '" + str(level) + "'"
-        return self.execute_single_response(sql, ())
+        sql = "SELECT LevelText, LevelPoints FROM LevelsTable WHERE LevelID = ?"
+        return self.execute_single_response(sql, (level,))
 
     def get_levels(self):
         """
@@ -1620,6 +2241,9 @@ class CharTable(UserLevelsTable):
               "foreign key(CharLevel) references LevelsTable(LevelID)" \
               ")"
         self.execute_query(sql, ())
+        # characters are found by their level (the CharID is included so the allowed characters can be
+        # found from the index alone)
+        self.execute_query("CREATE INDEX IF NOT EXISTS ix_chars_level ON CharTable(CharLevel, CharID)", ())
 
     def populate_table(self):
         """
@@ -1640,10 +2264,9 @@ class CharTable(UserLevelsTable):
         chars = "んあいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわを"
         level = "1111112222233333444445555566666777778889999988"
         # populates the database table with each character and it's corresponding information
-        for x in range(len(sounds)):
-            sql = "INSERT INTO CharTable(CharSound, CharKana, CharLevel) values (?,?,?)"
-            tup = (sounds[x], chars[x], int(level[x]))
-            self.execute_query(sql, tup)
+        # adds all of the characters to the database in one transaction
+        sql = "INSERT INTO CharTable(CharSound, CharKana, CharLevel) values (?,?,?)"
+        self.execute_many(sql, zip(sounds, chars, [int(char_level) for char_level in level]))
 
     def get_char_level(self, sound_id):
         """
@@ -1659,8 +2282,8 @@ class CharTable(UserLevelsTable):
         int
         """
         # gets the level of a specified character from the table, given it's sound
-        sql = "SELECT CharLevel FROM CharTable WHERE CharID = '" + str(sound_id) + "'"
-        level = self.execute_single_response(sql, ())[0]
+        sql = "SELECT CharLevel FROM CharTable WHERE CharID = ?"
+        level = self.execute_single_response(sql, (sound_id,))[0]
         return level
 
     def get_level_chars(self, level):
@@ -1676,8 +2299,8 @@ class CharTable(UserLevelsTable):
         -------
         list[tuple[str, str]]
         """
-        sql = "SELECT CharSound, CharKana FROM CharTable WHERE CharLevel = '" + str(level) + "'"
-        characters = self.execute_multiple_responses(sql, ())
+        sql = "SELECT CharSound, CharKana FROM CharTable WHERE CharLevel = ?"
+        characters = self.execute_multiple_responses(sql, (level,))
         return characters
 
     def find_char(self, num):
@@ -1693,8 +2316,8 @@ class CharTable(UserLevelsTable):
         -------
         tuple[str, str]
         """
-        sql = "SELECT CharSound, CharKana FROM CharTable WHERE CharID = " + str(num)
-        returned = self.execute_single_response(sql, ())
+        sql = "SELECT CharSound, CharKana FROM CharTable WHERE CharID = ?"
+        returned = self.execute_single_response(sql, (num,))
         return returned
 
     def select_some(self, number, userid):
@@ -1712,24 +2335,12 @@ class CharTable(UserLevelsTable):
         -------
         List[tuple[str, str]]
         """
-        to_return = []
-        done = []
-        allowed = self.get_allowed_chars(userid)
-        while len(done) < number:
-            # selects a random CharID
-            rand = random.randint(1, 46)
-            # if the user has learned that character
-            if rand in allowed:
-                # if the character hasn't already been selected
-                if rand not in done:
-                    # adds the charID to the list of selected values
-                    done.append(rand)
-                    # get the sound and kana related to the selected CharID
-                    sql = "SELECT CharSound, CharKana FROM CharTable WHERE CharID = '" + str(rand) + "'"
-                    result = self.execute_single_response(sql, ())
-                    # adds the tuple to the values to return
-                    to_return.append(result)
-        return to_return
+        # picks 'number' different random characters from the levels that the user has completed, in one query.
+        # (if the user knows fewer characters than 'number', all of the ones they know are returned)
+        sql = "SELECT CharSound, CharKana FROM CharTable " \
+              "WHERE CharLevel IN (SELECT LevelID FROM UserLevelsTable WHERE UserID = ?) " \
+              "ORDER BY RANDOM() LIMIT ?"
+        return self.execute_multiple_responses(sql, (userid, number))
 
 
 class GameTable(FriendsTable):
@@ -1790,6 +2401,11 @@ class GameTable(FriendsTable):
               "primary key(GameID)" \
               ")"
         self.execute_query(sql, ())
+        # the filters used when looking for a game to join
+        self.execute_query("CREATE INDEX IF NOT EXISTS ix_games_available "
+                           "ON GameTable(Full, Active, Private, GameType)", ())
+        # the games that check_active_games looks for
+        self.execute_query("CREATE INDEX IF NOT EXISTS ix_games_expiry ON GameTable(Active, Full, Created)", ())
 
     def check_active_games(self):
         """
@@ -1807,8 +2423,9 @@ class GameTable(FriendsTable):
         time_now = round(time.time())
         # five minutes ago
         five_mins = time_now - 300
-        sql = "UPDATE GameTable SET Active = False WHERE Created < '" + str(five_mins) + "' AND Full = False"
-        self.execute_query(sql, ())
+        # games that have already been deactivated aren't written again
+        sql = "UPDATE GameTable SET Active = False WHERE Active = True AND Full = False AND Created < ?"
+        self.execute_query(sql, (five_mins,))
 
     def game_active(self, game_id):
         """
@@ -1823,8 +2440,8 @@ class GameTable(FriendsTable):
         -------
         bool
         """
-        sql = "SELECT Active FROM GameTable WHERE GameID = '" + str(game_id) + "'"
-        active = self.execute_single_response(sql, ())
+        sql = "SELECT Active FROM GameTable WHERE GameID = ?"
+        active = self.execute_single_response(sql, (game_id,))
         return active[0]
 
     def new_game_row(self, private, g_type):
@@ -1864,8 +2481,8 @@ class GameTable(FriendsTable):
         -------
         None
         """
-        sql = "UPDATE GameTable SET Active = False WHERE GameID = '" + str(room) + "'"
-        self.execute_query(sql, ())
+        sql = "UPDATE GameTable SET Active = False WHERE GameID = ?"
+        self.execute_query(sql, (room,))
 
     def make_full(self, game_id):
         """
@@ -1900,7 +2517,7 @@ class GameTable(FriendsTable):
         -------
         bool
         """
-        sql = "SELECT * FROM GameTable WHERE GameID = ? AND Full = ?"
+        sql = "SELECT 1 FROM GameTable WHERE GameID = ? AND Full = ? LIMIT 1"
         tup = (game_id, False)
         returned = self.execute_single_response(sql, tup)
         if returned:
@@ -1930,6 +2547,9 @@ class UserPlayingTable(UserTable):
     streak(user: int)
         Checks whether the user' streak should be incremented/ reset to 0.
 
+    compute_streak(user: int)
+        Works out the user's current streak without changing the database.
+
     add_playing_points(userid: int, points: int)
         Adds a new record to the UserPlayingTable to show that the user has earned more points.
     """
@@ -1956,6 +2576,9 @@ class UserPlayingTable(UserTable):
               "foreign key(UserID) references UserTable(UserID)" \
               ")"
         self.execute_query(sql, ())
+        # covers the daily totals in streak() so they're read from the index alone
+        sql = "CREATE INDEX IF NOT EXISTS ix_user_playing ON UserPlayingTable(UserID, DateEarned, PointsEarned)"
+        self.execute_query(sql, ())
 
     def get_rounds(self, userid):
         """
@@ -1970,9 +2593,9 @@ class UserPlayingTable(UserTable):
         -------
         int
         """
-        sql = "SELECT * FROM UserPlayingTable WHERE UserID = '" + str(userid) + "'"
-        result = self.execute_multiple_responses(sql, ())
-        return len(result)
+        # counted from the ix_user_playing index without reading the rows themselves
+        sql = "SELECT COUNT(*) FROM UserPlayingTable WHERE UserID = ?"
+        return self.execute_single_response(sql, (userid,))[0]
 
     def get_streak(self, userid):
         """
@@ -1987,16 +2610,14 @@ class UserPlayingTable(UserTable):
         -------
         int
         """
-        self.streak(userid)
-        sql = "SELECT UserStreak FROM UserTable WHERE UserID = '" + str(userid) + "'"
-        result = self.execute_single_response(sql, ())[0]
-        return result
+        # streak() already knows the value, so it isn't read back from the UserTable
+        return self.streak(userid)
 
     def streak(self, user):
         """
         Checks whether the user' streak should be incremented/ reset to 0.
 
-        Sees if the user has earned at least 40 points in the last 24 hours.
+        Only writes the UserStreak to the UserTable when it has changed. Returns the streak.
 
         Parameters
         ----------
@@ -2007,37 +2628,49 @@ class UserPlayingTable(UserTable):
         -------
         int
         """
-        sql = "SELECT DateEarned FROM UserPlayingTable WHERE UserID = '" + str(user) + "' LIMIT 1"
-        earliest = self.execute_single_response(sql, ())
-        try:
-            # the first datetime that the user earned points
-            earliest = earliest[0]
-            streak = 0
+        streak = self.compute_streak(user)
+        stats = self.user_stats(user)
+        # sets the new streak (the stored one is used for the awards)
+        if stats is not None and stats.UserStreak != streak:
+            sql = "UPDATE UserTable SET UserStreak = ? WHERE UserID = ?"
+            self.execute_query(sql, (streak, user))
+            _stats_cache.pop(str(user))
+        return streak
+
+    def compute_streak(self, user):
+        """
+        Works out the user's current streak without changing the database.
+
+        Counts the 24 hour periods in a row (up to now) where the user has earned at least 40 points.
+
+        Parameters
+        ----------
+        user: int
+            The UserID of the user to work out the streak of.
+
+        Returns
+        -------
+        int
+        """
+        sql = "SELECT MIN(DateEarned) FROM UserPlayingTable WHERE UserID = ?"
+        # the first datetime that the user earned points
+        earliest = self.execute_single_response(sql, (user,))[0]
+        streak = 0
+        # if the user has never earned any points, their streak is 0.
+        if earliest is not None:
             now = round(time.time())
-            # until the value of earliest reaches now.
-            while earliest < int(now):
-                # select all of the points earned in a 24 hour period
-                sql = "SELECT PointsEarned FROM UserPlayingTable WHERE UserID = '" + str(
-                    user) + "' AND DateEarned BETWEEN '" + str(earliest) + "' AND '" + str(earliest + 86400) + "'"
-                results = self.execute_multiple_responses(sql, ())
-                # adds up the points to see whether there are more than 40, and if not, the streak is set to 0
-                total = 0
-                for result in results:
-                    total += result[0]
-                if total < 40:
-                    streak = 0
-                else:
-                    streak += 1
-                # increases 'earliest' by 86400 seconds (one day)
-                earliest += 86400
-            # sets the new streak
-            sql = "UPDATE UserTable SET UserStreak = '" + str(streak) + "' WHERE UserID = '" + str(user) + "'"
-            self.execute_query(sql, ())
-        except:
-            # if the user has never earned any points, set their streak to 0.
-            streak = 0
-            sql = "UPDATE UserTable SET UserStreak = '" + str(streak) + "' WHERE UserID = '" + str(user) + "'"
-            self.execute_query(sql, ())
+            # the number of 24 hour periods from earliest until now
+            days = -(-(now - earliest) // 86400)
+            # adds up the points earned in each 24 hour period since earliest, in one query
+            sql = "SELECT (DateEarned - ?) / 86400 AS DayIndex, SUM(PointsEarned) FROM UserPlayingTable " \
+                  "WHERE UserID = ? GROUP BY DayIndex"
+            totals = dict(self.execute_multiple_responses(sql, (earliest, user)))
+            # counts back from the latest period until one has less than 40 points
+            day = days - 1
+            while day >= 0 and totals.get(day, 0) >= 40:
+                streak += 1
+                day -= 1
+        return streak
 
     def add_playing_points(self, userid, points):
         """
@@ -2057,10 +2690,14 @@ class UserPlayingTable(UserTable):
         # adds a record to the table that records the points that the user earned in a turn
         sql = "INSERT INTO UserPlayingTable(UserID, PointsEarned, DateEarned) VALUES (?,?,?)"
         tup = (userid, points, int(time.time()))
-        self.execute_query(sql, tup)
-        # adds the points to the user's total points too
-        self.add_total_points(userid, points)
-        self.add_total_points(userid, points)
+        with self.transaction():
+            self.execute_query(sql, tup)
+            # adds the points to the user's total points too
+            self.add_total_points(userid, points)
+        # the cached stats are removed once the changes are committed
+        _stats_cache.pop(str(userid))
+        # the stored streak isn't refreshed here - get_streak() does that when the profile is viewed,
+        # before the awards are checked, so a round doesn't cost the extra streak queries.
 
 
 class GameUserTable(GameTable, UserTable):
@@ -2097,6 +2734,9 @@ class GameUserTable(GameTable, UserTable):
 
     get_available_public_games(user: int)
         Returns a list of public games that the user can join.
+
+    find_available_games(user: int, private: bool, extra_filter: str, extra_values: tuple)
+        Returns up to 10 active, not full games that the user isn't already in, along with each game's creator.
     """
 
     def __init__(self):
@@ -2114,6 +2754,8 @@ class GameUserTable(GameTable, UserTable):
         None
         """
         self.drop_table('GameUserTable')
+        _creator_cache.clear()
+        _member_cache.clear()
         sql = "CREATE TABLE IF NOT EXISTS GameUserTable(" \
               "GameUserID INTEGER," \
               "GameID INTEGER," \
@@ -2125,6 +2767,8 @@ class GameUserTable(GameTable, UserTable):
               "foreign key(GameID) references GameTable(GameID)" \
               ")"
         self.execute_query(sql, ())
+        # a user can only be in a game once
+        self.execute_query("CREATE UNIQUE INDEX IF NOT EXISTS ix_game_users ON GameUserTable(GameID, PlayerID)", ())
 
     def user_allowed(self, game_id, user):
         """
@@ -2137,13 +2781,16 @@ class GameUserTable(GameTable, UserTable):
         user:
         :return:
         """
-        sql = "SELECT * FROM GameUserTable WHERE GameID = ? AND PlayerID = ?"
         tup = (game_id, user)
+        if _member_cache.get(tup):
+            return True
+        sql = "SELECT 1 FROM GameUserTable WHERE GameID = ? AND PlayerID = ? LIMIT 1"
         result = self.execute_single_response(sql, tup)
         # if the user is not a member of the game (if they directly try to get to the room)
         if result is None:
             return False
         else:
+            _member_cache.put(tup, True)
             return True
 
     def others_in_room(self, game_id, user):
@@ -2162,8 +2809,9 @@ class GameUserTable(GameTable, UserTable):
         -------
         tuple[int, str] or None
         """
-        sql = "SELECT PlayerID FROM GameUserTable WHERE GameID = " + str(game_id) + " AND PlayerID != " + str(user)
-        tmp = self.execute_single_response(sql, ())
+        # the earliest other member of the game, so the same user is always returned
+        sql = "SELECT PlayerID FROM GameUserTable WHERE GameID = ? AND PlayerID != ? ORDER BY GameUserID LIMIT 1"
+        tmp = self.execute_single_response(sql, (game_id, user))
         if tmp:
             found = self.find_username(tmp[0])
             found_tup = (tmp[0], found)
@@ -2185,8 +2833,12 @@ class GameUserTable(GameTable, UserTable):
         -------
         int
         """
-        sql = "SELECT PlayerID FROM GameUserTable WHERE GameID = " + str(game_id)
-        found = self.execute_single_response(sql, ())[0]
+        found = _creator_cache.get(str(game_id))
+        if found is None:
+            # the creator is the first user to have joined the game
+            sql = "SELECT PlayerID FROM GameUserTable WHERE GameID = ? ORDER BY GameUserID LIMIT 1"
+            found = self.execute_single_response(sql, (game_id,))[0]
+            _creator_cache.put(str(game_id), found)
         return found
 
     def create_new_game(self, userID, private, g_type):
@@ -2208,8 +2860,10 @@ class GameUserTable(GameTable, UserTable):
         -------
         int
         """
-        game_id = self.new_game_row(private, g_type)
-        self.new_game_user(userID, game_id)
+        # the game and its first player are added together, so a game is never left without its creator
+        with self.transaction():
+            game_id = self.new_game_row(private, g_type)
+            self.new_game_user(userID, game_id)
         return game_id
 
     def new_game_user(self, userID, game_id):
@@ -2227,11 +2881,11 @@ class GameUserTable(GameTable, UserTable):
         -------
         None
         """
-        # if the user is not already a member of the game
-        if not self.user_allowed(userID, game_id):
-            sql = "INSERT INTO GameUserTable(GameID, PlayerID, Points, Correct) VALUES (?, ?, ?, ?)"
-            tup = (game_id, userID, 0, 0)
-            self.execute_query(sql, tup)
+        # the unique index on (GameID, PlayerID) means nothing is added if the user is already a member of the game
+        sql = "INSERT OR IGNORE INTO GameUserTable(GameID, PlayerID, Points, Correct) VALUES (?, ?, ?, ?)"
+        tup = (game_id, userID, 0, 0)
+        self.execute_query(sql, tup)
+        _member_cache.put((game_id, userID), True)
 
     def get_available_private_games(self, user):
         """
@@ -2251,59 +2905,13 @@ class GameUserTable(GameTable, UserTable):
         """
         # get all of the user's that they are friends with
         friends = self.get_user_friends(user, True)
-        # if the user has at least one friend
-        if friends != []:
-            try:
-                # select the GameIDs where the game is made by on of the user's friend
-                sql = "SELECT GameID FROM GameUserTable WHERE PlayerID IN '" + str(tuple(friends)) + "'"
-                found = self.execute_multiple_responses(sql, ())
-            except Exception as e:
-                # if the user only has one friend, select GameIDs where the game is made by their friend
-                friend = friends[0]
-                sql = "SELECT GameID FROM GameUserTable WHERE PlayerID = '" + str(friend) + "'"
-                found = self.execute_multiple_responses(sql, ())
-            tmp = []
-            # make tmp the list of GameIDs
-            for item in found:
-                tmp.append(item[0])
-            found = tmp
-            try:
-                if len(found) > 1:
-                    # if more than 1 GameID is found, get up to 10 games where the user is allowed to join
-                    sql = "SELECT * FROM GameTable WHERE GameID IN " + str(tuple(found)) + \
-                          " AND Full = False AND Active = True AND Private = True AND GameType = 'drawing' " \
-                          "ORDER BY GameID LIMIT 10"
-                    found_games = self.execute_multiple_responses(sql, ())
-                else:
-                    # if only one GameID is found, see whether that game is available
-                    sql = "SELECT * FROM GameTable WHERE GameID = " + str(found[0]) + \
-                          " AND Full = False AND Active = True AND Private = True AND GameType = 'drawing'"
-                    found_games = self.execute_multiple_responses(sql, ())
-            except Exception as e:
-                # if no GameIDs were found
-                found_games = []
-        else:
+        if friends == []:
             # return no games if the user doesn't have any friends
-            found_games = []
-        users = []
-        usernames = []
-        game_id = []
-        for game in found_games:
-            # if the user isn't already in the game
-            if not self.user_allowed(game[0], user):
-                # for each of the returned games, find the user who made the game
-                user_id = self.room_creator(game[0])
-                game_id.append(game[0])
-                users.append(user_id)
-                usernames.append(self.find_username(user_id))
-        lists = []
-        # for each game found, add the tuple of (GameID, UserID of creator, Username of creator)
-        for x in range(len(users)):
-            tup = (game_id[x], users[x], usernames[x])
-            lists.append(tup)
-        # a list of tuples that contain the userid, username and room id for each of the rooms
-        # that fit the criteria
-        return lists
+            return []
+        # only games that one of the user's friends is in
+        friend_filter = "AND EXISTS(SELECT 1 FROM GameUserTable AS Friend WHERE Friend.GameID = GameTable.GameID " \
+                        "AND Friend.PlayerID IN (" + ",".join("?" * len(friends)) + ")) "
+        return self.find_available_games(user, True, friend_filter, tuple(friends))
 
     def get_available_public_games(self, user):
         """
@@ -2321,28 +2929,42 @@ class GameUserTable(GameTable, UserTable):
         list[tuple[int, int, str]]
         """
         # find all of the available public games.
-        sql = "SELECT * FROM GameTable WHERE Full = 0 AND Active = 1 " \
-              "AND Private = 0 AND GameType = 'drawing' ORDER BY GameID LIMIT 10"
-        found = self.execute_multiple_responses(sql, ())
-        users = []
-        usernames = []
-        game_id = []
-        for game in found:
-            # if the user si not already in the game
-            if not self.user_allowed(game[0], user):
-                # for each of the returned games, find the user who made the game
-                user_id = self.room_creator(game[0])
-                game_id.append(game[0])
-                users.append(user_id)
-                usernames.append(self.find_username(user_id))
-        lists = []
-        # for each game found, add the tuple of (GameID, UserID of creator, Username of creator)
-        for x in range(len(users)):
-            tup = (game_id[x], users[x], usernames[x])
-            lists.append(tup)
-        # a list of tuples that contain the userid, username and room id for each of the rooms
-        # that fit the criteria
-        return lists
+        return self.find_available_games(user, False, "", ())
+
+    def find_available_games(self, user, private, extra_filter, extra_values):
+        """
+        Returns up to 10 active, not full games that the user isn't already in, along with each game's creator.
+
+        The creator (the first user to join the game) and their username are found in the same query.
+
+        Parameters
+        ----------
+        user: int
+            The UserID of the user looking for a game.
+        private: bool
+            Whether to look for private games (True) or public games (False).
+        extra_filter: str
+            Any extra conditions on the games, starting with AND (can be an empty string).
+        extra_values: tuple
+            The values for the placeholders in extra_filter.
+
+        Returns
+        -------
+        list[tuple[int, int, str]]
+        """
+        sql = "SELECT GameTable.GameID, UserTable.UserID, UserTable.Username FROM GameTable " \
+              "INNER JOIN GameUserTable ON GameUserTable.GameUserID = " \
+              "(SELECT MIN(GameUserID) FROM GameUserTable AS First WHERE First.GameID = GameTable.GameID) " \
+              "INNER JOIN UserTable ON UserTable.UserID = GameUserTable.PlayerID " \
+              "WHERE GameTable.Full = False AND GameTable.Active = True AND GameTable.Private = ? " \
+              "AND GameTable.GameType = 'drawing' " \
+              "AND NOT EXISTS(SELECT 1 FROM GameUserTable AS Joined " \
+              "WHERE Joined.GameID = GameTable.GameID AND Joined.PlayerID = ?) " \
+              + extra_filter + \
+              "ORDER BY GameTable.GameID LIMIT 10"
+        # a list of tuples that contain the room id, and the userid and username of the user who made each of
+        # the rooms that fit the criteria
+        return self.execute_multiple_responses(sql, (private, user) + extra_values)
 
 
 class ChatroomTable(FriendsTable):
@@ -2396,6 +3018,9 @@ class ChatroomTable(FriendsTable):
               "foreign key(UserB) references UserTable(UserID)" \
               ")"
         self.execute_query(sql, ())
+        # get_room looks the pair of users up in either order
+        self.execute_query("CREATE INDEX IF NOT EXISTS ix_chatrooms_ab ON ChatroomTable(UserA, UserB)", ())
+        self.execute_query("CREATE INDEX IF NOT EXISTS ix_chatrooms_ba ON ChatroomTable(UserB, UserA)", ())
 
     def get_room(self, userA, userB):
         """
@@ -2414,10 +3039,9 @@ class ChatroomTable(FriendsTable):
         -------
         int or False
         """
-        sql = "SELECT ChatID FROM ChatroomTable WHERE (UserA = '" + str(userA) + \
-              "' AND UserB = '" + str(userB) + "') OR (UserA = '" + str(userB) + \
-              "' AND UserB = '" + str(userA) + "')"
-        result = self.execute_single_response(sql, ())
+        sql = "SELECT ChatID FROM ChatroomTable WHERE (UserA = ? AND UserB = ?) OR (UserA = ? AND UserB = ?) " \
+              "ORDER BY ChatID LIMIT 1"
+        result = self.execute_single_response(sql, (userA, userB, userB, userA))
         if not result:
             return False
         return result[0]
@@ -2437,9 +3061,8 @@ class ChatroomTable(FriendsTable):
         -------
         bool
         """
-        sql = "SELECT * FROM ChatroomTable WHERE ChatID = '" + str(room) + \
-              "' AND (UserA = '" + str(userid) + "' OR UserB = '" + str(userid) + "')"
-        result = self.execute_multiple_responses(sql, ())
+        sql = "SELECT 1 FROM ChatroomTable WHERE ChatID = ? AND (UserA = ? OR UserB = ?) LIMIT 1"
+        result = self.execute_single_response(sql, (room, userid, userid))
         if not result:
             return False
         return True
@@ -2457,13 +3080,15 @@ class ChatroomTable(FriendsTable):
         -------
         tuple[int, int]
         """
-        sql = "SELECT UserA, UserB FROM ChatroomTable WHERE ChatID = '" + str(room) + "'"
-        return self.execute_single_response(sql, ())
+        sql = "SELECT UserA, UserB FROM ChatroomTable WHERE ChatID = ?"
+        return self.execute_single_response(sql, (room,))
 
     def new_chat(self, userA, userB):
         """
         Creates a new chatroom between two users.
 
+        If the users already have a chatroom, its ChatID is returned instead.
+
         Parameters
         ----------
         userA: int
@@ -2475,12 +3100,18 @@ class ChatroomTable(FriendsTable):
         -------
         int
         """
-        allowed = self.check_friends(userB, userA)
-        if not allowed:
-            return False
-        sql = "INSERT INTO ChatroomTable(UserA, UserB) VALUES (?,?)"
-        tup = (userA, userB)
-        return self.execute_return_id(sql, tup)
+        # the checks and the new chatroom are made in one transaction, so two requests at once
+        # (e.g. the link being clicked twice) can't make two chatrooms for the same users
+        with self.transaction():
+            allowed = self.check_friends(userB, userA)
+            if not allowed:
+                return False
+            existing = self.get_room(userA, userB)
+            if existing:
+                return existing
+            sql = "INSERT INTO ChatroomTable(UserA, UserB) VALUES (?,?)"
+            tup = (userA, userB)
+            return self.execute_return_id(sql, tup)
 
     def check_chat(self, chatid, userid):
         """
@@ -2497,9 +3128,8 @@ class ChatroomTable(FriendsTable):
         -------
         bool
         """
-        sql = "SELECT * FROM ChatroomTable WHERE ChatID = '" + str(chatid) + "' AND (UserA = '" \
-              + str(userid) + "' OR UserB = '" + str(userid) + "')"
-        result = self.execute_single_response(sql, ())
+        sql = "SELECT 1 FROM ChatroomTable WHERE ChatID = ? AND (UserA = ? OR UserB = ?) LIMIT 1"
+        result = self.execute_single_response(sql, (chatid, userid, userid))
         if not result:
             return False
         return True
@@ -2516,8 +3146,8 @@ class ChatMessageTable(ChatroomTable):
     create_table()
         Creates the ChatMessageTable table in the database.
 
-    get_messages(userFrom: int, userTo: int)
-        Gets all of the messages from and to a specific user.
+    get_messages(user: int, other: int)
+        Gets all of the messages sent between two users, oldest first.
 
     add_messages(sender: int, recipient: int, room: int, message: str)
         Adds a new record to the table, with a new message between two users.
@@ -2549,25 +3179,31 @@ class ChatMessageTable(ChatroomTable):
               "foreign key(ChatID) references ChatroomTable(ChatID)" \
               ")"
         self.execute_query(sql, ())
+        self.execute_query("CREATE INDEX IF NOT EXISTS ix_chat_messages "
+                           "ON ChatMessageTable(MessageFrom, MessageTo, DateTime)", ())
 
-    def get_messages(self, userFrom, userTo):
+    def get_messages(self, user, other):
         """
-        Gets all of the messages to and from a specific user.
+        Gets all of the messages sent between two users (in both directions), oldest first.
+
+        The MessageFrom of each message shows which of the users sent it.
 
         Parameters
         ----------
-        userFrom: int
-            The UserID of the user who sent the messages
-        userTo: int
-            The UserID of the user who received the messages
+        user: int
+            The UserID of one of the users
+        other: int
+            The UserID of the other user
 
         Returns
         -------
         list[tuple[str, int, int]]
         """
-        sql = "SELECT Message, DateTime, MessageFrom FROM ChatMessageTable WHERE MessageFrom = '" + str(userFrom) + \
-              "' AND MessageTo = '" + str(userTo) + "'"
-        return self.execute_multiple_responses(sql, ())
+        # each direction is read in DateTime order from the ix_chat_messages index
+        sql = "SELECT Message, DateTime, MessageFrom FROM ChatMessageTable " \
+              "WHERE (MessageFrom = ? AND MessageTo = ?) OR (MessageFrom = ? AND MessageTo = ?) " \
+              "ORDER BY DateTime, MessageID"
+        return self.execute_multiple_responses(sql, (user, other, other, user))
 
     def add_messages(self, sender, recipient, room, message):
         """
@@ -7,13 +7,41 @@ It populates and selects data from the database.
 This script is imported by main_app.py when the main program is run.
 
 The packages that should be installed to be able to run this file are:
-bs4 (BeautifulSoup), lxml, sqlite3
+lxml, sqlite3, threading, os, pickle, gzip, io, contextlib
 """
 
 
-from bs4 import BeautifulSoup
-import lxml
+from lxml import etree
 import sqlite3
+import threading
+import os
+import pickle
+import gzip
+import io
+from contextlib import contextmanager
+from databases import LRUCache
+
+
+# the number of entries that are inserted into the database at a time
+BATCH_SIZE = 10000
+# the number of bytes read from the JMdict_e file at a time (1MB)
+READ_BUFFER = 1 << 20
+# the most words that are returned for one search
+MAX_RESULTS = 20
+# used while the dictionary is being loaded - a much larger page cache so the tables and indexes are built in memory.
+# the same database file also holds the user tables (see databases.py), so the journal and syncing are left on
+# (WAL with synchronous=NORMAL) - a crash or rollback during the load can't corrupt the rest of the data.
+BULK_LOAD_PRAGMAS = "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA temp_store=MEMORY; " \
+                    "PRAGMA cache_size=-200000;"
+# used for every connection - the dictionary tables are only read while the website is running, so a large
+# page cache and memory mapping the file (the same as databases.py) mean searches rarely need to read from the disk
+CONNECTION_PRAGMAS = "PRAGMA temp_store=MEMORY; PRAGMA cache_size=-65536; PRAGMA mmap_size=268435456;"
+# puts the connection back to the settings that the rest of the website uses for the database (see databases.py)
+NORMAL_PRAGMAS = "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; " + CONNECTION_PRAGMAS
+
+# the dictionary made by get_from_wordids for each WordID that has been looked up recently, keyed by WordID.
+# emptied when the dictionary tables are loaded again.
+_word_cache = LRUCache(4096)
 
 
 """
@@ -58,9 +86,14 @@ class Database:
     ----------
     db: str
         The path to the database file that will be accessed.
+    local: threading.local
+        Holds each thread's connection to the database.
 
     Methods
     -------
+    get_connection()
+        Returns this thread's connection to the database, connecting the first time it is used.
+
     execute_multiple_responses(sql: str, tup: tuple)
         Executes query and returns list of responses.
 
@@ -78,14 +111,39 @@ class Database:
 
     create_meaning()
         Deletes the currently existing WordMeaningTable and re-creates it.
+
+    bulk_load_mode()
+        Sets this thread's connection up for loading a lot of data at once, and puts the normal settings back after.
     """
     def __init__(self):
         self.db = "databases/website_database2.db"
+        self.local = threading.local()
+
+    def get_connection(self):
+        """
+        Returns this thread's connection to the database, connecting the first time it is used.
+
+        The connection is kept open and reused by every query made from the same thread, rather than
+        connecting to the database again for each query. It is in autocommit mode, so each query
+        is committed as soon as it has run.
+
+        No required parameters.
+
+        returns
+        --------
+        sqlite3.Connection
+        """
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db, isolation_level=None)
+            conn.executescript(CONNECTION_PRAGMAS)
+            self.local.conn = conn
+        return conn
 
     # when more than one response is expected, returning a list from all of the valid results
     def execute_multiple_responses(self, sql, tup):
         """
-        Connects to the database, executes the SQL query, and returns all responses.
+        Executes the SQL query on this thread's connection, and returns all responses.
 
         Used for SELECT queries where one or more responses are expected.
 
@@ -100,15 +158,14 @@ class Database:
         --------
         list
         """
-        with sqlite3.connect(self.db) as db:
-            cursor = db.cursor()
-            cursor.execute(sql, tup)
-            result = cursor.fetchall()
-            return result
+        cursor = self.get_connection().execute(sql, tup)
+        result = cursor.fetchall()
+        cursor.close()
+        return result
 
     def execute_query(self, sql, tup):
         """
-        Connects to the database and executes the SQL query passed in.
+        Executes the SQL query passed in on this thread's connection.
 
         Used for INSERT and DELETE queries - no values are returned from this method.
 
@@ -123,14 +180,12 @@ class Database:
         --------
         None
         """
-        with sqlite3.connect(self.db) as conn:
-            cursor = conn.cursor()
-            cursor.execute(sql, tup)
-            conn.commit()
+        cursor = self.get_connection().execute(sql, tup)
+        cursor.close()
 
     def execute_query_rowid(self, sql, tup):
         """
-        Connects to the database, executes the SQL query and returns the primary key of the row just added.
+        Executes the SQL query and returns the primary key of the row just added.
 
         Used when a new chat/game is added and the system needs to know the ID of the game/chat
         for the user to be admitted.
@@ -146,11 +201,39 @@ class Database:
         --------
         integer
         """
-        with sqlite3.connect(self.db) as conn:
-            cursor = conn.cursor()
-            cursor.execute(sql, tup)
-            conn.commit()
-            return cursor.lastrowid
+        cursor = self.get_connection().execute(sql, tup)
+        cursor.close()
+        return cursor.lastrowid
+
+    @contextmanager
+    def bulk_load_mode(self):
+        """
+        Sets this thread's connection up for loading a lot of data at once, and puts the normal settings back after.
+
+        Everything inside the with block is one transaction, committed at the end (or rolled back if
+        the load fails). Afterwards the write-ahead log is checkpointed and truncated, as the load
+        leaves it as large as the word tables.
+
+        No required parameters.
+
+        returns
+        --------
+        contextmanager
+        """
+        # this thread's own connection is used, so the settings only apply to the load
+        conn = self.get_connection()
+        conn.executescript(BULK_LOAD_PRAGMAS)
+        try:
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            else:
+                conn.execute("COMMIT")
+        finally:
+            conn.executescript(NORMAL_PRAGMAS + " PRAGMA wal_checkpoint(TRUNCATE);")
 
     def create_word(self):
         """
@@ -202,6 +285,9 @@ class Database:
         -------
         None
         """
+        # the search index of the meanings is made from this table, so it is removed too
+        sql = "DROP TABLE IF EXISTS WordMeaningSearch"
+        self.execute_query(sql, ())
         sql = "DROP TABLE WordMeaningTable"
         self.execute_query(sql, ())
         sql = "CREATE TABLE IF NOT EXISTS WordMeaningTable(" \
@@ -224,8 +310,10 @@ class Entry(Database):
 
     Attributes
     ----------
-    soup: object
-        The beautiful soup object containing all of the data from the JMdict_e file.
+    jmdict: str
+        The path to the JMdict_e file that the dictionary data is read from.
+    meaning_search: bool or None
+        Whether the WordMeaningSearch table exists (None until it has been checked).
 
     Methods
     -------
@@ -233,10 +321,17 @@ class Entry(Database):
         Returns a dictionary of the primary reading, other readings and
         meanings associated with a WordID.
 
+    get_from_wordids(wordids: list[int])
+        Returns a dictionary with the primary reading, other readings and meanings of each of the WordIDs,
+        all found with one query.
+
     get_from_query(word: str)
         Returns a list of dictionaries containing all words/meanings/readings
         similar to what the user has entered.
 
+    meaning_filter()
+        Returns the SQL condition that finds the rows of the WordMeaningTable with a meaning LIKE the parameter.
+
     check_primary(word: str)
         Returns the list of tuples of WordIDs of primary readings that match the user's search.
 
@@ -246,15 +341,76 @@ class Entry(Database):
     check_meanings(word: str)
         Returns the list of tuples of WordIDs of meanings that are similar to the user's search.
 
+    iter_entries()
+        Yields each entry element from the JMdict_e file, one at a time.
+
+    source_path()
+        Returns the path of the JMdict_e file to read the dictionary from.
+
     insert_all_data()
         Resets the three database tables, inserts all of the data from the XML file into the tables.
+
+    iter_batches()
+        Yields the rows for the WordTable, WordReadingTable and WordMeaningTable, BATCH_SIZE words at a time.
+
+    parse_batches()
+        Parses the JMdict_e file, yielding the rows for the WordTable, WordReadingTable and WordMeaningTable
+        BATCH_SIZE words at a time.
+
+    insert_rows(cursor: sqlite3.Cursor, words: list, readings: list, meanings: list)
+        Inserts a batch of rows into the WordTable, WordReadingTable and WordMeaningTable.
+
+    create_indexes(cursor: sqlite3.Cursor)
+        Creates the indexes used to search the dictionary tables.
     """
 
-    def __init__(self, soup=False):
+    def __init__(self):
         super().__init__()
-        if soup:
-            with open("databases/JMdict_e", encoding="utf8") as fle:
-                self.soup = BeautifulSoup(fle, 'xml')
+        self.jmdict = "databases/JMdict_e"
+        self.meaning_search = None
+
+    def iter_entries(self):
+        """
+        Yields each entry element from the JMdict_e file, one at a time.
+
+        The file is parsed as it is read (1MB at a time), and each entry is cleared once it has been used,
+        so the whole document is never held in memory.
+
+        No required parameters.
+
+        Yields
+        ------
+        lxml.etree._Element
+        """
+        path = self.source_path()
+        if path.endswith(".gz"):
+            # decompressed as it is read, so the uncompressed file is never written to the disk
+            fle = io.BufferedReader(gzip.open(path, "rb"), buffer_size=READ_BUFFER)
+        else:
+            fle = open(path, "rb", buffering=READ_BUFFER)
+        with fle:
+            for _, entry in etree.iterparse(fle, tag="entry"):
+                yield entry
+                # frees the entry, and the entries before it, now that they have been used
+                entry.clear()
+                while entry.getprevious() is not None:
+                    del entry.getparent()[0]
+
+    def source_path(self):
+        """
+        Returns the path of the JMdict_e file to read the dictionary from.
+
+        This is JMdict_e itself, or the compressed JMdict_e.gz (as it is downloaded) if only that is there.
+
+        No required parameters.
+
+        Returns
+        -------
+        str
+        """
+        if not os.path.exists(self.jmdict) and os.path.exists(self.jmdict + ".gz"):
+            return self.jmdict + ".gz"
+        return self.jmdict
 
     def get_from_wordid(self, wordid):
         """
@@ -270,22 +426,62 @@ class Entry(Database):
         -------
         dict
         """
-        sql = "SELECT WordTable.PrimaryReading, WordMeaningTable.Meaning, WordReadingTable.Reading " \
+        return self.get_from_wordids([wordid])[wordid]
+
+    def get_from_wordids(self, wordids):
+        """
+        Returns a dictionary with the primary reading, other readings and meanings of each of the WordIDs,
+        all found with one query.
+
+        WordIDs that have been looked up recently are taken from a cache instead of the database.
+
+        Parameters
+        ----------
+        wordids: list[int]
+            The WordIDs of the readings/meanings to get (can contain the same WordID more than once).
+
+        Returns
+        -------
+        dict[int, dict]
+        """
+        words = {}
+        # the WordIDs that haven't been looked up recently
+        missing = []
+        for wordid in wordids:
+            if wordid not in words:
+                words[wordid] = _word_cache.get(wordid)
+                if words[wordid] is None:
+                    # the dictionary for the WordID (left empty if the WordID has no meanings)
+                    words[wordid] = {"PrimaryReading": "", "Meanings": [], "Readings": []}
+                    missing.append(wordid)
+        if not missing:
+            return words
+        sql = "SELECT WordTable.WordID, WordTable.PrimaryReading, WordMeaningTable.Meaning, " \
+              "WordReadingTable.Reading " \
               "FROM WordTable " \
               "INNER JOIN WordMeaningTable ON WordTable.WordID = WordMeaningTable.WordID " \
               "LEFT JOIN WordReadingTable ON WordTable.WordID = WordReadingTable.WordID " \
-              "WHERE WordTable.WordID = '" + str(wordid) + "'"
-        returned = self.execute_multiple_responses(sql, ())
-        return_values = {"PrimaryReading": "", "Meanings": [], "Readings": []}
+              "WHERE WordTable.WordID IN (" + ",".join("?" * len(missing)) + ") " \
+              "ORDER BY WordMeaningTable.MeaningID, WordReadingTable.ReadingID"
+        returned = self.execute_multiple_responses(sql, tuple(missing))
 
+        # the meanings and readings already added for each WordID (the JOIN repeats each meaning
+        # once for every reading, so sets are used rather than searching through the lists)
+        seen = {wordid: (set(), set()) for wordid in missing}
         # constructs the dictionary with the readings and meanings to be returned
         for result in returned:
-            return_values["PrimaryReading"] = result[0]
-            if result[1] not in return_values["Meanings"]:
-                return_values["Meanings"].append(result[1])
-            if result[2] not in return_values["Readings"]:
-                return_values["Readings"].append(result[2])
-        return return_values
+            return_values = words[result[0]]
+            meanings_seen, readings_seen = seen[result[0]]
+            return_values["PrimaryReading"] = result[1]
+            if result[2] not in meanings_seen:
+                meanings_seen.add(result[2])
+                return_values["Meanings"].append(result[2])
+            if result[3] not in readings_seen:
+                readings_seen.add(result[3])
+                return_values["Readings"].append(result[3])
+        for wordid in missing:
+            _word_cache.put(wordid, words[wordid])
+        return words
 
     def get_from_query(self, word):
         """
@@ -301,32 +497,55 @@ class Entry(Database):
         -------
         list[dict]
         """
-        word = word.replace("'", "''")
         # when the user searches a word, the program cannot tell whether they have entered english, kana or kanji.
         # therefore, the program searches through the reading and meaning tables to find matching values, as well
         # as the kanji/primary reading itself.
-        total_words = []
-        # finds out the WordID of every direct match to an entry in the WordTable
-        primary_results = self.check_primary(word)
-        for primary in primary_results:
-            # finds all of the readings and meanings associated with the WordID returned in the
-            # list of PrimaryReading matches (returns a dictionary) -- adds it to the list of results to return
-            total_words.append(self.get_from_wordid(primary[0]))
-        # finds out the WordID of every instance where one of the meanings is similar to what was searched
-        meaning_results = self.check_meanings(word)
-        for mean in meaning_results:
-            # finds all of the readings and meanings associated with the WordID returned in the
-            # list of Meaning matches (returns a dictionary) -- adds it to the list of results to return
-            total_words.append(self.get_from_wordid(mean[0]))
-        # finds out the WordID of every instance where one of the readings matches what was searched
-        reading_results = self.check_readings(word)
-        for read in reading_results:
-            # finds all of the readings and meanings associated with the WordID returned in the
-            # list of PrimaryReading matches (returns a dictionary) -- adds it to the list of results to return
-            total_words.append(self.get_from_wordid(read[0]))
-
+        # one query finds the WordID of every direct match to an entry in the WordTable, then of up to 8 instances
+        # where one of the meanings is similar to what was searched, then of every instance where one of the
+        # readings matches what was searched.
+        sql = "SELECT 0 AS Source, WordID, WordID AS Position FROM WordTable WHERE PrimaryReading = ? " \
+              "UNION ALL " \
+              "SELECT 1, WordID, MeaningID FROM (SELECT WordID, MeaningID FROM WordMeaningTable " \
+              "WHERE " + self.meaning_filter() + " ORDER BY MeaningID LIMIT 8) " \
+              "UNION ALL " \
+              "SELECT 2, WordID, ReadingID FROM WordReadingTable WHERE Reading = ? " \
+              "ORDER BY Source, Position"
+        found = self.execute_multiple_responses(sql, (word, "%" + word + "%", word))
+        # each word is only shown once (e.g. if more than one of its meanings matched), and at most
+        # MAX_RESULTS words are shown
+        wordids = []
+        seen = set()
+        for result in found:
+            if len(wordids) >= MAX_RESULTS:
+                break
+            if result[1] not in seen:
+                seen.add(result[1])
+                wordids.append(result[1])
+        # finds all of the readings and meanings associated with every WordID returned at once
+        # (a dictionary for each WordID)
+        words = self.get_from_wordids(wordids)
         # returns the list of dictionaries with relevant results
-        return total_words
+        return [words[wordid] for wordid in wordids]
+
+    def meaning_filter(self):
+        """
+        Returns the SQL condition that finds the rows of the WordMeaningTable with a meaning LIKE the parameter.
+
+        Uses the WordMeaningSearch index when it exists, and otherwise searches the WordMeaningTable itself
+        (e.g. if the dictionary was loaded before the index was added).
+
+        No required parameters.
+
+        Returns
+        -------
+        str
+        """
+        if self.meaning_search is None:
+            sql = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'WordMeaningSearch'"
+            self.meaning_search = self.execute_multiple_responses(sql, ()) != []
+        if self.meaning_search:
+            return "MeaningID IN (SELECT rowid FROM WordMeaningSearch WHERE Meaning LIKE ?)"
+        return "Meaning LIKE ?"
 
     def check_primary(self, word):
         """
@@ -341,8 +560,8 @@ class Entry(Database):
         -------
         list[tup[int,]]
         """
-        sql = "SELECT WordID FROM WordTable WHERE PrimaryReading = '" + str(word) + "'"
-        results = self.execute_multiple_responses(sql, ())
+        sql = "SELECT WordID FROM WordTable WHERE PrimaryReading = ?"
+        results = self.execute_multiple_responses(sql, (word,))
         return results
 
     def check_readings(self, word):
@@ -358,8 +577,8 @@ class Entry(Database):
         -------
         list[tup[int,]]
         """
-        sql = "SELECT WordID FROM WordReadingTable WHERE Reading = '" + str(word) + "'"
-        results = self.execute_multiple_responses(sql, ())
+        sql = "SELECT WordID FROM WordReadingTable WHERE Reading = ?"
+        results = self.execute_multiple_responses(sql, (word,))
         return results
 
     def check_meanings(self, word):
@@ -376,8 +595,8 @@ class Entry(Database):
         -------
         list[tup[int,]]
         """
-        sql = "SELECT WordID FROM WordMeaningTable WHERE Meaning LIKE '%" + word + "%' LIMIT 8"
-        results = self.execute_multiple_responses(sql, ())
+        sql = "SELECT WordID FROM WordMeaningTable WHERE " + self.meaning_filter() + " ORDER BY MeaningID LIMIT 8"
+        results = self.execute_multiple_responses(sql, ("%" + word + "%",))
         return results
 
     def insert_all_data(self):
@@ -391,61 +610,163 @@ class Entry(Database):
         None
         """
         # clears all of the current word tables (drops them and remakes them)
+        _word_cache.clear()
         self.create_word()
         self.create_meaning()
         self.create_reading()
-        entries = self.soup.find_all('entry')
+        # one connection and one transaction for the whole load (committed when the with block ends)
+        with self.bulk_load_mode() as conn:
+            cursor = conn.cursor()
+            for words, readings, meanings in self.iter_batches():
+                self.insert_rows(cursor, words, readings, meanings)
+            # the indexes are built once all of the rows are in, rather than being updated by every insert
+            self.create_indexes(cursor)
+
+    def iter_batches(self):
+        """
+        Yields the rows for the WordTable, WordReadingTable and WordMeaningTable, BATCH_SIZE words at a time.
+
+        The rows are read from the cache file made the last time the JMdict_e file was parsed, as long as
+        JMdict_e hasn't changed since (the same modification time and size). Otherwise the file is parsed
+        again, and the rows are saved to a new cache file as they are yielded.
+
+        No required parameters.
+
+        Yields
+        ------
+        tuple[list[tuple[int, str]], list[tuple[int, str]], list[tuple[int, str]]]
+        """
+        source = os.stat(self.source_path())
+        # identifies the version of the JMdict_e file that the rows were made from
+        key = (source.st_mtime_ns, source.st_size)
+        cache = self.jmdict + ".pickle"
+        if os.path.exists(cache):
+            with open(cache, "rb") as fle:
+                if pickle.load(fle) == key:
+                    # each batch was saved separately, so only one batch is loaded at a time
+                    while True:
+                        try:
+                            yield pickle.load(fle)
+                        except EOFError:
+                            return
+        # the cache is only put in place once all of the entries have been parsed
+        with open(cache + ".tmp", "wb") as fle:
+            pickle.dump(key, fle)
+            for batch in self.parse_batches():
+                pickle.dump(batch, fle, pickle.HIGHEST_PROTOCOL)
+                yield batch
+        os.replace(cache + ".tmp", cache)
+
+    def parse_batches(self):
+        """
+        Parses the JMdict_e file, yielding the rows for the WordTable, WordReadingTable and WordMeaningTable
+        BATCH_SIZE words at a time.
+
+        No required parameters.
+
+        Yields
+        ------
+        tuple[list[tuple[int, str]], list[tuple[int, str]], list[tuple[int, str]]]
+        """
+        # the rows waiting to be inserted into each table
+        words = []
+        readings = []
+        meanings_rows = []
+        # the tables are empty, so the WordIDs can be given out here rather than read back after each insert
+        id_ = 0
         # for each entry
-        for entry in entries:
-            # create a list of all of the reb, keb and gloss tags
-            other_readings = entry.find_all('reb')
-            kanji = entry.find_all('keb')
-            meanings = entry.find_all('gloss')
+        for entry in self.iter_entries():
+            # create a list of all of the reb, keb and gloss tags (in one walk through the entry)
+            other_readings = []
+            kanji = []
+            meanings = []
+            tag_lists = {'reb': other_readings, 'keb': kanji, 'gloss': meanings}
+            for item in entry.iter('reb', 'keb', 'gloss'):
+                tag_lists[item.tag].append(item)
             # if there is at least one keb tag
-            if kanji != []:
-                # if there is more than one
-                if len(kanji) > 1:
-                    # add all but the first to 'other_readings'
-                    for x in range(1, (len(kanji))):
-                        other_readings.append(kanji[x])
-                # make 'kanji' be a list with the single element which is the first keb element
-                kanji = kanji[:1]
+            if kanji:
+                # add all but the first to 'other_readings', the first keb element is the primary reading
+                other_readings.extend(kanji[1:])
+                kanji = kanji[0]
+            elif other_readings:
+                # let the first reb element be the primary reading, and remove it from other_readings
+                kanji = other_readings.pop(0)
             else:
-                # let 'kanji' be the first reb element, and remove it from other_readings
-                kanji = other_readings[:1]
-                other_readings.pop(0)
-            try:
-                s_readings = []
-                s_kanji = []
-                s_meanings = []
-                # adds the 'text' part of the tag to the appropriate list.
-                for item in other_readings:
-                    s_readings.append(item.contents[0])
-                for item in kanji:
-                    s_kanji.append(item.contents[0])
-                for item in meanings:
-                    s_meanings.append(item.contents[0])
-
-                if len(s_kanji) != 0:
-                    # insert the data from the entry into the database tables.
-                    id_ = 0
-                    for k in s_kanji:
-                        sql = "INSERT INTO WordTable(PrimaryReading) VALUES (?)"
-                        # returns the ID of the new primary reading added, so that the other
-                        # readings and meanings can be associated to it.
-                        id_ = self.execute_query_rowid(sql, (k,))
-                    for reading in s_readings:
-                        sql = "INSERT INTO WordReadingTable(WordID, Reading) VALUES (?,?)"
-                        tup = (id_, reading)
-                        self.execute_query(sql, tup)
-                    for meaning in s_meanings:
-                        sql = "INSERT INTO WordMeaningTable(WordID, Meaning) VALUES (?,?)"
-                        tup = (id_, meaning)
-                        self.execute_query(sql, tup)
-                else:
-                    pass
-            except Exception as e:
-                pass
+                # skips entries without any readings
+                continue
+            # the 'text' part of each of the tags
+            s_kanji = kanji.text
+            s_readings = [item.text for item in other_readings]
+            s_meanings = [item.text for item in meanings]
+            # skips entries with an empty tag
+            if s_kanji is None or None in s_readings or None in s_meanings:
+                continue
+            # adds the data from the entry to the rows to be inserted into the database tables.
+            id_ += 1
+            words.append((id_, s_kanji))
+            for reading in s_readings:
+                readings.append((id_, reading))
+            for meaning in s_meanings:
+                meanings_rows.append((id_, meaning))
+            if len(words) >= BATCH_SIZE:
+                yield words, readings, meanings_rows
+                words = []
+                readings = []
+                meanings_rows = []
+        # whatever is left over
+        if words:
+            yield words, readings, meanings_rows
+
+    def create_indexes(self, cursor):
+        """
+        Creates the indexes used to search the dictionary tables.
+
+        Called after the tables have been loaded (building an index in one go is much quicker than
+        keeping it up to date while the rows are inserted). The indexes are dropped with their tables.
+
+        Parameters
+        ----------
+        cursor: sqlite3.Cursor
+            The cursor of the connection that the tables were loaded with.
+
+        Returns
+        -------
+        None
+        """
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_word_primary ON WordTable(PrimaryReading)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_reading ON WordReadingTable(Reading)")
+        # used to join the readings and meanings to their word
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_reading_word ON WordReadingTable(WordID)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_meaning_word ON WordMeaningTable(WordID)")
+        # a full text search index of the meanings, split into trigrams so that it can be used for
+        # LIKE '%...%' searches (for searches of at least 3 characters)
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS WordMeaningSearch USING fts5("
+                       "Meaning, content='WordMeaningTable', content_rowid='MeaningID', tokenize='trigram')")
+        cursor.execute("INSERT INTO WordMeaningSearch(WordMeaningSearch) VALUES ('rebuild')")
+        self.meaning_search = True
+
+    def insert_rows(self, cursor, words, readings, meanings):
+        """
+        Inserts a batch of rows into the WordTable, WordReadingTable and WordMeaningTable.
+
+        Parameters
+        ----------
+        cursor: sqlite3.Cursor
+            The cursor of the connection that the rows are inserted with.
+        words: list[tuple[int, str]]
+            The (WordID, PrimaryReading) rows for the WordTable.
+        readings: list[tuple[int, str]]
+            The (WordID, Reading) rows for the WordReadingTable.
+        meanings: list[tuple[int, str]]
+            The (WordID, Meaning) rows for the WordMeaningTable.
+
+        Returns
+        -------
+        None
+        """
+        cursor.executemany("INSERT INTO WordTable(WordID, PrimaryReading) VALUES (?,?)", words)
+        cursor.executemany("INSERT INTO WordReadingTable(WordID, Reading) VALUES (?,?)", readings)
+        cursor.executemany("INSERT INTO WordMeaningTable(WordID, Meaning) VALUES (?,?)", meanings)
 
 
 if __name__ == "__main__":
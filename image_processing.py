@@ -4,7 +4,7 @@ This file is used to deal with the CSV files holding testing and training data f
 It also deals with new drawings that a user has drawn on the website.
 
 The packages that should be installed to be able to run this file are:
-PIL, numPy, base64, copy, csv, itertools
+PIL, numPy, sciPy, base64, io, os, csv, multiprocessing
 
 The files within the system that must also be available are:
 neuralNetwork.py
@@ -13,11 +13,13 @@ neuralNetwork.py
 
 from PIL import Image
 import numpy as np
+from scipy import ndimage
 from neuralNetwork import Run
 import base64
-import copy
+import io
+import os
 import csv
-from itertools import chain
+from multiprocessing import Pool
 
 run_neural = Run()
 
@@ -31,24 +33,18 @@ def check(csv_file):
         The path to the CSV file that will have the data to be checked.
     :return:
     """
-    # opens the CSV file and writes all of the data to a list - 'data-list'
-    data_file = open(csv_file, "r")
-    data_list = data_file.readlines()
-    data_file.close()
-
-    # splits the first item in the list of CSV lines into a list of individual pixels
-    all_values = data_list[0].split(",")
-    # reshapes the list into an array to correctly align the pixels
-    image_arr = np.asfarray(all_values[1:]).reshape((28, 28))
-    img = Image.new('RGB', (28, 28), "white")
-    # creates an array of all of the pixels
-    pixels = img.load()
-    # for each pixel in the image
-    for i in range(28):
-        for j in range(28):
-            # get the rgb values of the current pixel
-            # alter the values to be all the same - making a grey colour
-            pixels[i, j] = (int(255 - image_arr[j][i]), int(255 - image_arr[j][i]), int(255 - image_arr[j][i]))
+    # opens the CSV file and reads the first line
+    with open(csv_file, "r") as data_file:
+        first_line = data_file.readline()
+
+    # parses the line straight into an array of the individual values
+    all_values = np.fromstring(first_line, sep=",")
+    # reshapes the pixels into an array to correctly align the pixels
+    image_arr = all_values[1:].reshape((28, 28))
+    # inverts the values so that the drawing is dark on a white background
+    grey = (255 - image_arr).astype(np.uint8)
+    # makes all of the rgb values the same - making a grey colour
+    img = Image.fromarray(np.stack([grey, grey, grey], axis=-1), "RGB")
     # displays the image
     img.show()
 
@@ -59,7 +55,7 @@ def process_all(list_of_strokes, username, char_num, submission_type):
     Processes the data url taken from the HTML canvas of the user's drawing.
 
     Makes the image less detailed by reducing it from 420x420 to 28x28 so that the neural network can manage it.
-    Converts the image array to CSV values to add to the training data/ user's drawing CSV so that it can be
+    Converts the image array to CSV values to add to the training data CSV/ the user's drawing so that it can be
     used for training or tested by the neural network.
 
     Returns None if submission_type is "train" - since the submission is not tested by the neural network in this case.
@@ -82,72 +78,46 @@ def process_all(list_of_strokes, username, char_num, submission_type):
     """
 
     x = 0
+    # the CSV lines of the user's drawing after each stroke
+    user_rows = []
     for stroke in list_of_strokes:
-        filename = "images/tmp_file_" + username + ".png"
         # increments the stroke number
         x += 1
         # the string data URL is passed into this variable
         stroke_url = list_of_strokes[stroke]
         # Removing the useless part of the url.
         img_data = stroke_url[21:]
-        # writes the image data from the data URL to a png by using base64 decoding
-        # on the data URL
-        with open(filename, "wb") as fh:
-            fh.write(base64.b64decode(img_data))
+        # opens the png straight from the image data in the data URL by using base64 decoding
+        # on the data URL (without writing it to a file first)
         # processes the png to make the smaller image. This also adds the
         # character to the CSV file for the training data for the specific
         # stroke number.
-        image = Image.open(filename)
-        text = str(char_num)
-        new_img = Image.new('RGB', (28, 28), "white")
-        # creates an array of the pixels
-        pixels = new_img.load()
-        # creates a string with just the correct number (this string will contain the csv for the image)
-        # for each pixel in the original image, taking the correct number of steps each time
-        # to correctly fit the original image into a 28x28 pixel image
+        image = Image.open(io.BytesIO(base64.b64decode(img_data)))
+        # creates an array of the pixels - [rows][columns][rgba]
+        image_arr = np.asarray(image.convert("RGBA"))
+        # as the image is greyscale, it doesnt matter which value from the rgba is taken
+        grey = image_arr[:, :, 0].astype(np.int64)
+        # any pixel that isn't fully opaque is treated as white
+        grey[image_arr[:, :, 3] != 255] = 255
+        # the number of original pixels in each direction that make up one pixel of the 28x28 image
         step = image.size[0] // 28
-        for i in range(0, image.size[0], step):
-            for j in range(0, image.size[1], step):
-                # the average colour of the collection of pixels
-                average = 0
-                # for each pixel within the larger block
-                for a in range(i, i + step):
-                    for b in range(j, j + step):
-                        # this fixes the orientation of the image by changing the order
-                        # but actually gets the colour value
-                        original_rgb = image.getpixel((b, a))
-                        if original_rgb[3] != 255:
-                            original_rgb = (255, 255, 255, 0)
-                        # as the image is greyscale, it doesnt matter which value from the tuple is taken
-                        # the colour value is added to the average
-                        average += original_rgb[0]
-                # the total average is divided by the number of pixels.
-                average = average // 225
-                # assigns the new image's pixel rgb value for the original pixels from this area
-                pixels[j / step, i / step] = (255 - average, 255 - average, 255 - average)
-                # adds the value to the text string - creating the csv string
-                text += "," + str(255 - average)
+        # splits the image into 28x28 blocks of step x step pixels and finds the average colour of each block
+        blocks = grey[:28 * step, :28 * step].reshape(28, step, 28, step)
+        average = blocks.sum(axis=(1, 3)) // (step * step)
+        # creates the csv string for the image - the correct number followed by each of the values
+        text = str(char_num) + "," + ",".join(map(str, (255 - average).ravel().tolist()))
         # if the drawing is training data, add it to the training data CSV file for the stroke.
         if submission_type == "train":
             file_nm = open("images/TTImages/Level9-Stroke" + str(x) + ".csv", "a")
             file_nm.write(text + "\n")
             file_nm.close()
         else:
-            # add the stroke CSV to the user's drawing CSV file.
-            csv_file = "images/userGuesses/" + username + ".csv"
-            if x == 1:
-                # overwrites what is in the file if this is the first stroke
-                csv_open = open(csv_file, "w+")
-            else:
-                # appends to the file if not
-                csv_open = open(csv_file, "a")
-            csv_open.write(text + "\n")
-            csv_open.close()
+            # add the stroke CSV to the user's drawing CSV lines.
+            user_rows.append(text + "\n")
     # if the user has submitted the drawing as part of a game (it needs to be marked)...
     if submission_type == "game":
         # run the neural network to check the drawing
-        csv_fle = "images/userGuesses/" + username + ".csv"
-        results, thought = run_neural.test_from_drawing(csv_fle)
+        results, thought = run_neural.test_from_rows(user_rows)
         # if the user has drawn a valid number of strokes (<5)
         if results != "Invalid":
             x = 0
@@ -211,180 +181,122 @@ def shift_image():
     for x in range(1, 47):
         each_char[x] = 0
 
-    # for each of the files containing training data, open and write the lines to a list
-    file1 = open("images/old_images/Level9-Stroke1.csv", "r")
-    images_1 = file1.readlines()
-    file1.close()
-    file2 = open("images/old_images/Level9-Stroke2.csv", "r")
-    images_2 = file2.readlines()
-    file2.close()
-    file3 = open("images/old_images/Level9-Stroke3.csv", "r")
-    images_3 = file3.readlines()
-    file3.close()
-    file4 = open("images/old_images/Level9-Stroke4.csv", "r")
-    images_4 = file4.readlines()
-    file4.close()
+    # for each of the files containing training data, load all of the lines into an array - [line][values]
+    images_1 = np.loadtxt("images/old_images/Level9-Stroke1.csv", delimiter=",", dtype=np.int32, ndmin=2)
+    images_2 = np.loadtxt("images/old_images/Level9-Stroke2.csv", delimiter=",", dtype=np.int32, ndmin=2)
+    images_3 = np.loadtxt("images/old_images/Level9-Stroke3.csv", delimiter=",", dtype=np.int32, ndmin=2)
+    images_4 = np.loadtxt("images/old_images/Level9-Stroke4.csv", delimiter=",", dtype=np.int32, ndmin=2)
+
+    # a list of (stroke index, current CSV line, CSV line of the final image) for every image
+    tasks = []
     # for each item in each of the lists
-    for tm_strokes in [images_1, images_2, images_3, images_4]:
-        for image_csv in tm_strokes:
-            lines_to_write = []
-            # create a list of values in the CSV line
-            separated = image_csv.split(",")
+    for stroke_index, tm_strokes in enumerate([images_1, images_2, images_3, images_4]):
+        for image_row in tm_strokes:
             # as the charID is always the first value in the CSV line
-            char_num = int(separated[0])
+            char_num = int(image_row[0])
             # the number of strokes that the current character has.
             no = str(characters_strokes[str(char_num)])
 
             # gets the CSV line of the final image of the current drawing
             # (so that when the current stroke is moved, it only moves as much as the final image can
             # before it moves off the canvas)
+            final_row = image_row
             if no == "2":
-                separated = images_2[strokes_dict["2"]].split(",")
+                final_row = images_2[strokes_dict["2"]]
             elif no == "3":
-                separated = images_3[strokes_dict["3"]].split(",")
+                final_row = images_3[strokes_dict["3"]]
             elif no == "4":
-                separated = images_4[strokes_dict["4"]].split(",")
-
-            # reshapes the CSV line to an array representing the 28x28 image
-            image_arr_np = np.asfarray(np.reshape(separated[1:], (28, 28)))
+                final_row = images_4[strokes_dict["4"]]
 
             strokes_dict[no] += 1
-            # image_arr = [rows][columns]
             each_char[char_num] += 1
-            # how many places the array can go 'up' before the image goes off the canvas.
-
-            # index at the top
-            i_t = -1
-            end = False
-            while not end:
-                i_t += 1
-                # check that all of the 'pixels' on the top row are white
-                for item in image_arr_np[i_t]:
-                    # if they're not, the image can't move any further up.
-                    if item != 0:
-                        end = True
-            i_t = abs(i_t)
-
-            # how many places the array can go 'down' before the image goes off the canvas.
-            i_b = 1
-            end = False
-            while not end:
-                i_b -= 1
-                # check that all of the 'pixels' on the current row are white
-                for item in image_arr_np[i_b]:
-                    # if not, they can't move any further down.
-                    if item != 0:
-                        end = True
-            i_b = abs(i_b)
-
-            # how many places the array can go 'left' before the image goes off the canvas.
-            i_l = -1
-            end = False
-            while not end:
-                i_l += 1
-                # check that all of the 'pixels' on the current column are white
-                for j in range(len(image_arr_np)):
-                    # if not, the image can't go any further left.
-                    if image_arr_np[j][i_l] != 0:
-                        end = True
-            i_l = abs(i_l)
-
-            # how many places the array can go 'right' before the image goes off the canvas.
-            i_r = 0
-            end = False
-            while not end:
-                i_r -= 1
-                # check that all of the 'pixels' on the current row are white
-                for j in range(len(image_arr_np)):
-                    # if not, the image can't go any further right
-                    if image_arr_np[j][i_r] != 0:
-                        end = True
-            i_r = abs(i_r)
-
-
-            # (the abs at the end of each calculation makes the value positive)
-
-            # adjusts the found values so that the maximum that the drawing can go in any direction is 4 pixels
-            # this speeds up the algorithm slightly
-            if i_t > 4:
-                i_t = 4
-            if i_b > 4:
-                i_b = 4
-            if i_l > 4:
-                i_l = 4
-            if i_l > 4:
-                i_l = 4
-
-            # the total that the image can move in the x direction
-            total_y = i_l + i_r
-            # the total that the image can move in the y direction
-            total_x = i_t + i_b
-
-            # gets the current CSV value (not the final stroke of this character anymore)
-            separated = image_csv.split(",")
-            image_arr_np = np.asfarray(np.reshape(separated[1:], (28, 28)))
-            image_arr = image_arr_np.tolist()
-
-            # moves the image the furthest down and left that it can go reaching the found limit.
-            for x in range(i_b):
-                tmp = image_arr.pop(-1)
-                image_arr.insert(0, tmp)
-            for y in range(i_l + 1):
-                for a in range(len(image_arr)):
-                    tmp2 = image_arr[a].pop(0)
-                    image_arr[a].append(tmp2)
-
-            # recreates the list with the new position - from array
-            lis = list(chain.from_iterable(image_arr))
-            lis.insert(0, int(char_num))
-            # creates an array of the newly created list and adds it to the lines to write to the CSV file
-            array = np.asfarray(lis)
-            lines_to_write.append(array.astype(int))
-
-            # creates a copy of the current array to keep as the array changes.
-            tmp_image_arr = copy.deepcopy(image_arr)
-
-            rep = 0
-            # move the array as far up as possible (by the found values earlier)
-            for c in range(total_x + 1):
-                rep += 1
-                # move the array as far right as possible (by the found values)
-                for d in range(total_y):
-                    # for each of the arrays in the array, pop the final value and add it to the
-                    # beginning of the array
-                    for a in range(len(tmp_image_arr)):
-                        tmp3 = tmp_image_arr[a].pop(-1)
-                        tmp_image_arr[a].insert(0, tmp3)
-                    # converts the new array to a list and inserts the char_num -
-                    # so that it matches the format of the CSV values
-                    lis = list(chain.from_iterable(tmp_image_arr))
-                    lis.insert(0, int(char_num))
-                    array = np.asfarray(lis)
-                    # add the new position to the lines to write.
-                    lines_to_write.append(array.astype(int))
-                tmp_image_arr = copy.deepcopy(image_arr)
-                # moves it back to the original position (far left) so that it can be moved up slightly again
-                for re in range(rep):
-                    tmp1 = tmp_image_arr.pop(0)
-                    tmp_image_arr.append(tmp1)
-
-            # in the correct file for the stroke, add all of the new CSV lines.
-            if tm_strokes == images_1:
-                with open("images/TTImages/character_copies_1.csv", "a", newline='') as fle:
-                    writer = csv.writer(fle)
-                    writer.writerows(lines_to_write)
-            elif tm_strokes == images_2:
-                with open("images/TTImages/character_copies_2.csv", "a", newline='') as fle:
-                    writer = csv.writer(fle)
-                    writer.writerows(lines_to_write)
-            elif tm_strokes == images_3:
-                with open("images/TTImages/character_copies_3.csv", "a", newline='') as fle:
-                    writer = csv.writer(fle)
-                    writer.writerows(lines_to_write)
-            else:
-                with open("images/TTImages/character_copies_4.csv", "a", newline='') as fle:
-                    writer = csv.writer(fle)
-                    writer.writerows(lines_to_write)
+            tasks.append((stroke_index, image_row, final_row))
+
+    # opens each of the files that the new lines are added to once, rather than for every image
+    copy_files = [open("images/TTImages/character_copies_" + str(y) + ".csv", "a", newline='', buffering=1 << 20)
+                  for y in range(1, 5)]
+    try:
+        writers = [csv.writer(fle) for fle in copy_files]
+        # each image is shifted independently, so the work is split between all of the cores.
+        # imap keeps the results in the same order as the tasks, so the files are written in the same order.
+        with Pool() as pool:
+            for stroke_index, rows in pool.imap(shift_variants, tasks, chunksize=64):
+                # in the correct file for the stroke, add all of the new CSV lines.
+                writers[stroke_index].writerows(rows.tolist())
+    finally:
+        for fle in copy_files:
+            fle.close()
+
+
+def shift_variants(task):
+    """
+    Finds every position that a single image can be moved to without going off the canvas.
+
+    Used by shift_image() - this runs in a separate process for each image.
+
+    Parameters
+    ----------
+    task: tuple
+        The stroke index (0-3), the CSV line of the image (as an array) and the CSV line of the final
+        image of the drawing (as an array).
+
+    Returns
+    -------
+    tuple[int, object]
+        The stroke index and the numPy array of the new CSV lines.
+    """
+    stroke_index, image_row, final_row = task
+    char_num = int(image_row[0])
+    # reshapes the CSV line to an array representing the 28x28 image
+    # image_arr = [rows][columns]
+    image_arr_np = final_row[1:].reshape((28, 28))
+
+    # which rows and columns have any part of the drawing in them.
+    row_has = np.any(image_arr_np != 0, axis=1)
+    col_has = np.any(image_arr_np != 0, axis=0)
+
+    # how many places the array can go up/down/left/right before the image goes off the canvas -
+    # the number of empty rows/columns before the first one containing part of the drawing.
+    # (argmax finds the first True value, or 0 if the canvas is empty)
+    i_t = int(np.argmax(row_has))
+    i_b = int(np.argmax(row_has[::-1]))
+    i_l = int(np.argmax(col_has))
+    i_r = int(np.argmax(col_has[::-1]))
+
+    # adjusts the found values so that the maximum that the drawing can go in any direction is 4 pixels
+    # this speeds up the algorithm slightly
+    i_t = min(i_t, 4)
+    i_b = min(i_b, 4)
+    i_l = min(i_l, 4)
+    i_r = min(i_r, 4)
+
+    # the total that the image can move in the x direction
+    total_y = i_l + i_r
+    # the total that the image can move in the y direction
+    total_x = i_t + i_b
+
+    # gets the current CSV value (not the final stroke of this character anymore)
+    image_arr_np = image_row[1:].reshape((28, 28))
+
+    # moves the image the furthest down and left that it can go reaching the found limit.
+    image_arr = np.roll(image_arr_np, (i_b, -i_l), axis=(0, 1))
+
+    # every position the array is moved to (including the starting position) - as far up as possible
+    # (by the found values earlier) and, for each of those, as far right as possible (by the found values)
+    ups = np.repeat(np.arange(total_x + 1), total_y + 1)
+    rights = np.tile(np.arange(total_y + 1), total_x + 1)
+    # the rows/columns of image_arr that end up in each row/column of each new position. this is the same as
+    # rolling the array up and right - as the image only moves as far as the found values,
+    # no part of the drawing wraps round to the other side
+    row_index = (np.arange(28) + ups[:, None]) % 28
+    col_index = (np.arange(28) - rights[:, None]) % 28
+
+    # one row for each position, the first being the starting position.
+    # each row is the char_num followed by the pixels in that position.
+    rows = np.empty((len(ups), 785), dtype=np.int32)
+    rows[:, 0] = char_num
+    rows[:, 1:] = image_arr[row_index[:, :, None], col_index[:, None, :]].reshape((-1, 784))
+    return stroke_index, rows
 
 
 def show_image(arr):
@@ -427,43 +339,30 @@ def copies(level_num, test=False):
     """
     # for each of the 4 strokes.
     for y in range(1, 5):
-        try:
-            # open the appropriate file for what is being duplicated.
-            if test:
-                image_file = open("images/TTImages/Level" + str(level_num) + "-Stroke" + str(y) + "-test.csv")
-            else:
-                image_file = open("images/TTImages/Level" + str(level_num) + "-Stroke" + str(y) + ".csv")
-            images = image_file.readlines()
-            image_file.close()
-            lines_to_add = []
-            # for each of the images, rotate the image by 5 degrees each direction.
-            for image_csv in images:
-                for x in range(-5, 5):
-                    separated = image_csv.split(",")
-                    # remove the char_num before rotating the array.
-                    char_num = str(separated[0])
-                    image_arr_np = np.asfarray(np.reshape(separated[1:], (28, 28)))
-                    original = Image.fromarray(image_arr_np)
-                    rotated = original.rotate(x)
-                    array = np.asfarray(rotated)
-                    # convert the array back to a list and add the char_num at index 0
-                    lis = list(chain.from_iterable(array))
-                    lis.insert(0, int(char_num))
-                    # single dimensional array
-                    array = np.asfarray(lis)
-                    # add the array to the CSV lines to add
-                    lines_to_add.append(array.astype(int))
-            # add the lines to the appropriate testing/training file.
-            if test:
-                with open("images/TTImages/Level" + str(level_num) + "-Stroke" + str(y) + "-test.csv", "a", newline='') as fle:
-                    writer = csv.writer(fle)
-                    writer.writerows(lines_to_add)
-            else:
-                with open("images/TTImages/Level" + str(level_num) + "-Stroke" + str(y) + ".csv", "a", newline='') as fle:
-                    writer = csv.writer(fle)
-                    writer.writerows(lines_to_add)
-        except:
-            pass
+        # the appropriate file for what is being duplicated.
+        if test:
+            file_name = "images/TTImages/Level" + str(level_num) + "-Stroke" + str(y) + "-test.csv"
+        else:
+            file_name = "images/TTImages/Level" + str(level_num) + "-Stroke" + str(y) + ".csv"
+        # not every level has a file for every stroke.
+        if not os.path.exists(file_name):
+            continue
+        # creates an array of all of the images - [image][values]
+        all_values = np.loadtxt(file_name, delimiter=",", ndmin=2)
+        # the char_num is removed before rotating the arrays.
+        char_nums = all_values[:, 0]
+        image_arrs = all_values[:, 1:].reshape((-1, 28, 28))
+        # rotates every image by each angle from 5 degrees one way to 4 degrees the other
+        # (the same nearest pixel rotation as PIL's Image.rotate)
+        rotated = np.stack([ndimage.rotate(image_arrs, x, axes=(2, 1), reshape=False, order=0,
+                                           mode="grid-constant", cval=0) for x in range(-5, 5)], axis=1)
+        # adds the char_num back at index 0 of each rotated image so each image's copies are kept together
+        lines_to_add = np.concatenate((np.repeat(char_nums, 10)[:, None], rotated.reshape((-1, 784))),
+                                      axis=1).astype(int)
+        # add the lines to the appropriate testing/training file.
+        # (with the same line endings as the csv module uses)
+        with open(file_name, "ab") as fle:
+            np.savetxt(fle, lines_to_add, fmt="%d", delimiter=",", newline="\r\n")
 
 
 def get(level_make, numbers):
@@ -484,25 +383,19 @@ def get(level_make, numbers):
     """
     # for each stroke 1-4
     for x in range(1, 5):
-        try:
-            # add all lines in the CSV file to a list
-            with open("images/TTImages/character-Stroke" + str(x) + ".csv", "r") as fle:
-                characters = fle.readlines()
-            adding = []
-            # for each line in the CSV, if the charID of the image in the line is in the list of
-            # CharIDs passed into the function, add the line to the list that will be added into the file.
-            for char in characters:
-                split = char.split(",")
-                if int(split[0]) in numbers:
-                    array = np.asfarray(split)
-                    adding.append(array.astype(int))
-
-            # insert all appropriate lines into the new file.
-            with open("images/TTImages/Level" + str(level_make) + "-Stroke" + str(x) + ".csv", "a", newline='') as fle:
-                writer = csv.writer(fle)
-                writer.writerows(adding)
-        except:
-            pass
+        file_name = "images/TTImages/character-Stroke" + str(x) + ".csv"
+        if not os.path.exists(file_name):
+            continue
+        # load all lines in the CSV file into an array - [line][values]
+        characters = np.loadtxt(file_name, delimiter=",", dtype=np.int32, ndmin=2)
+        # the lines in the CSV where the charID of the image in the line is in the list of
+        # CharIDs passed into the function - these will be added into the file.
+        adding = characters[np.isin(characters[:, 0], np.asarray(numbers, dtype=np.int32))]
+
+        # insert all appropriate lines into the new file.
+        # (with the same line endings as the csv module uses)
+        with open("images/TTImages/Level" + str(level_make) + "-Stroke" + str(x) + ".csv", "ab") as fle:
+            np.savetxt(fle, adding, fmt="%d", delimiter=",", newline="\r\n")
 
 
 if __name__ == "__main__":
@@ -324,13 +324,16 @@ def handle_message(data):
         # if there are no errors, the details are assumed to be valid, and the
         # account is added to the database
         if errors == []:
-            user_table.add_account(
-                (data['username'], generate_password_hash(data['password']),
-                 data['email'], False))
-            # adds the user to the email settings table - with all values as false
-            email_setting_table.new_row(user_table.find_id(data['username']))
+            # the account and its email settings are added in one transaction
+            with user_table.transaction():
+                user_table.add_account(
+                    (data['username'], generate_password_hash(data['password']),
+                     data['email'], False))
+                # adds the user to the email settings table - with all values as false
+                new_id = user_table.find_id(data['username'])
+                email_setting_table.new_row(new_id)
             # sets the user's details within the signup dict (so that it can be added when redirected to profile)
-            login_data_dict['UserID'] = user_table.find_id(data['username'])
+            login_data_dict['UserID'] = new_id
             login_data_dict['username'] = data['username']
             login_data_dict['email'] = data['email']
             # moves the user to their profile
@@ -539,9 +542,10 @@ def handle_message(data):
         emit('new_message', {'message': [message, time_now, from_]}, room=room)
 
     elif data['EventType'] == "get_messages":
-        # (message, datetime, messageFrom)
-        your_messages = chat_message_table.get_messages(session['UserID'], data['Other'])
-        other_messages = chat_message_table.get_messages(data['Other'], session['UserID'])
+        # (message, datetime, messageFrom) - the messages sent both ways are fetched together
+        messages = chat_message_table.get_messages(session['UserID'], data['Other'])
+        your_messages = [message for message in messages if message.MessageFrom == session['UserID']]
+        other_messages = [message for message in messages if message.MessageFrom != session['UserID']]
         data = {'yours': your_messages, 'others': other_messages}
         emit('recv_previous', data)
 
@@ -232,6 +232,9 @@ class Run(NeuralNetwork):
     test_from_drawing(csv_name: str)
         Tests a specified user's drawing - for each stroke in the drawing.
 
+    test_from_rows(strokes: list)
+        Tests the CSV lines of a user's drawing - for each stroke in the drawing.
+
     test_level(stroke_num: int)
         Tests the neural network in its current state to see how accurate it is.
     """
@@ -342,6 +345,25 @@ class Run(NeuralNetwork):
         # reads the CSV file to get a list of the image pixels after each stroke.
         open_csv = open(csv_name, "r")
         strokes = open_csv.readlines()
+        open_csv.close()
+        return self.test_from_rows(strokes)
+
+    def test_from_rows(self, strokes):
+        """
+        Tests the CSV lines of a user's drawing - for each stroke in the drawing.
+
+        Returns the list of boolean values (whether each stroke was correct) and the list of strings
+        indicating which character each stroke was mistaken for.
+
+        Parameters
+        ----------
+        strokes: list
+            The CSV lines (strings) of the image pixels after each stroke
+
+        Returns
+        -------
+        tuple[list[bool], list[str]]
+        """
         this_stroke = 0
         results_list = []
         thoughts = []